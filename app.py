@@ -1,16 +1,27 @@
 
 import os
-import shutil
+import json
+import asyncio
 import zipfile
-import tempfile
-from typing import List
+from typing import List, Dict, Any, Optional, Callable
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from utils import get_logger, generate_report_id, detect_language
-from llm_agent import generate_llm_review
-from pdf_report import build_pdf_report
+from utils import get_logger, detect_language, get_timestamp, is_reviewable, aggregate_rating
+from llm_agent import generate_llm_review_async, generate_llm_reviews_async, review_segments_async, stream_llm_review, close_async_client, get_pool_stats, MODEL_ROUTER
+from pdf_report import build_pdf_report_async, build_pdf_report_multi_async, warm_pdf_pool, shutdown_pdf_pool
+from review_cache import REVIEW_CACHE, SINGLE_FLIGHT
+from rate_limiter import GEMINI_RATE_LIMITER
+from jobs import JOB_QUEUE, QueueFullError
+from report_store import REPORT_STORE
+from diff_review import parse_unified_diff, diff_sources, build_segments
+from triage import TRIAGE_STATS
+from metrics import METRICS
+from context_cache import CONTEXT_CACHE
+from compactor import COMPACTION_STATS
+from hedging import GEMINI_HEDGER
+from circuit_breaker import GEMINI_CIRCUIT
 
 logger = get_logger("API")
 
@@ -23,109 +34,468 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global State for "Download Latest" (Not persistent, resets on restart)
-LATEST_REPORT_PATH = None
+@app.on_event("startup")
+async def startup_pdf_pool():
+    await warm_pdf_pool()
+
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await JOB_QUEUE.stop()
+    await close_async_client()
+    shutdown_pdf_pool()
+
+# Max LLM reviews in flight per request
+REVIEW_MAX_CONCURRENCY = int(os.getenv("REVIEW_MAX_CONCURRENCY", "4"))
+# Cap on files reviewed from one archive (each one is a Gemini call)
+REVIEW_ZIP_MAX_FILES = int(os.getenv("REVIEW_ZIP_MAX_FILES", "200"))
+# Decompressed size caps for archive members
+REVIEW_ZIP_MAX_MEMBER_BYTES = int(os.getenv("REVIEW_ZIP_MAX_MEMBER_BYTES", str(1024 * 1024)))
+REVIEW_ZIP_MAX_TOTAL_BYTES = int(os.getenv("REVIEW_ZIP_MAX_TOTAL_BYTES", str(50 * 1024 * 1024)))
+# Vendored / generated directories never worth reviewing
+ZIP_SKIP_DIRS = {".git", ".venv", "venv", "node_modules", "__pycache__", "__MACOSX", ".review_cache"}
+
+async def review_many(sources: Dict[str, str], progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Review {filename: source} concurrently, bounded by REVIEW_MAX_CONCURRENCY requests.
+    Returns files_map in input order: {filename: {"source", "language", "structured"}}.
+    progress(done, total) is called as each file finishes.
+    """
+    semaphore = asyncio.Semaphore(REVIEW_MAX_CONCURRENCY)
+    files = {fname: (source_code, detect_language(fname)) for fname, source_code in sources.items()}
+    done = 0
+
+    def _on_done(fname: str):
+        nonlocal done
+        done += 1
+        if progress:
+            progress(done, len(sources))
+
+    reviews = await generate_llm_reviews_async(files, semaphore, _on_done)
+    return {
+        fname: {"source": source_code, "language": language, "structured": reviews[fname]}
+        for fname, (source_code, language) in files.items()
+    }
+
+def _unique_name(filename: str, taken: Dict[str, Any]) -> str:
+    """Disambiguate duplicate upload names (a.py, a (2).py, ...)."""
+    if filename not in taken:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    n = 2
+    while f"{stem} ({n}){ext}" in taken:
+        n += 1
+    return f"{stem} ({n}){ext}"
+
+async def _store_report(report_id: str, payload: Dict[str, Any], title: str) -> Dict[str, Any]:
+    """Persist the response payload next to its PDF so any worker can serve it by id."""
+    payload["report_url"] = f"/api/reports/{report_id}?format=pdf"
+    await asyncio.to_thread(REPORT_STORE.save, report_id, payload, title)
+    return payload
+
+def _report_metadata(report_id: str, **extra) -> Dict[str, Any]:
+    date, time_of_day = get_timestamp().split(" ")
+    return {"report_id": report_id, "date": date, "time": time_of_day, **extra}
+
+async def run_single_review(filename: str, source_code: str) -> Dict[str, Any]:
+    """Review one file and build its PDF. Returns the /api/review response payload."""
+    language = detect_language(filename)
+    logger.info(f"Processing single file: {filename} ({language})")
+    
+    # 1. Generate Review
+    review_data = await generate_llm_review_async(source_code, filename, language)
+    
+    # 2. Generate PDF
+    report_id, output_path = REPORT_STORE.new_report()
+    await build_pdf_report_async(review_data, output_path, filename)
+    
+    return await _store_report(report_id, {
+        "status": "success",
+        "report_id": report_id,
+        "filename": filename,
+        "pdf_report": output_path,
+        "structured": review_data
+    }, filename)
+
+async def run_multi_review(sources: Dict[str, str], title: str = "Code Review Report",
+                           progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Review several files concurrently and build one combined PDF. Returns the response payload."""
+    logger.info(f"Processing {len(sources)} files (max {REVIEW_MAX_CONCURRENCY} in flight)")
+    files_map = await review_many(sources, progress)
+    rating = aggregate_rating(files_map)
+
+    report_id, output_path = REPORT_STORE.new_report()
+    await build_pdf_report_multi_async(files_map, output_path, _report_metadata(report_id, rating=rating, title=title))
+
+    return await _store_report(report_id, {
+        "status": "success",
+        "report_id": report_id,
+        "files": list(files_map.keys()),
+        "pdf_report": output_path,
+        "rating": rating,
+        "structured": {fname: entry["structured"] for fname, entry in files_map.items()}
+    }, title)
+
+async def run_diff_review(changes: Dict[str, Dict[str, Any]], title: str = "Pull Request Review") -> Dict[str, Any]:
+    """Review only changed hunks (plus context) per file and build one combined PDF."""
+    semaphore = asyncio.Semaphore(REVIEW_MAX_CONCURRENCY)
+    changed_lines = reviewed_lines = 0
+
+    async def _review(path: str, change: Dict[str, Any]):
+        nonlocal changed_lines, reviewed_lines
+        language = detect_language(path)
+        segments = build_segments(change)
+        changed_lines += len(change["changed"])
+        reviewed_lines += sum(s["end_line"] - s["start_line"] + 1 for s in segments)
+        async with semaphore:
+            review_data = await review_segments_async(segments, path, language)
+        excerpt = "".join(s["text"] for s in segments)
+        return path, {"source": excerpt, "language": language, "structured": review_data}
+
+    logger.info(f"Processing diff: {len(changes)} changed files")
+    files_map = dict(await asyncio.gather(*[_review(p, c) for p, c in sorted(changes.items())]))
+    rating = aggregate_rating(files_map)
+
+    report_id, output_path = REPORT_STORE.new_report()
+    await build_pdf_report_multi_async(files_map, output_path, _report_metadata(report_id, rating=rating, title=title))
+
+    return await _store_report(report_id, {
+        "status": "success",
+        "mode": "diff",
+        "report_id": report_id,
+        "files": list(files_map.keys()),
+        "changed_lines": changed_lines,
+        "reviewed_lines": reviewed_lines,
+        "pdf_report": output_path,
+        "rating": rating,
+        "structured": {fname: entry["structured"] for fname, entry in files_map.items()}
+    }, title)
+
+async def _read_upload(upload: UploadFile) -> bytes:
+    with METRICS.time("upload_read"):
+        content = await upload.read()
+    METRICS.inc("bytes_processed_total", len(content), origin="upload")
+    return content
+
+async def _read_uploads(files: List[UploadFile]) -> Dict[str, str]:
+    sources = {}
+    for upload in files:
+        content = await _read_upload(upload)
+        sources[_unique_name(upload.filename, sources)] = content.decode("utf-8", errors="ignore")
+    return sources
+
+def extract_zip_sources(fileobj, require_sources: bool = True) -> Dict[str, str]:
+    """
+    Read reviewable members straight from an uploaded ZIP (no copy, no extractall).
+    Names are filtered before anything is decompressed; per-member and total sizes are capped.
+    """
+    with METRICS.time("zip"):
+        sources = _read_zip_members(fileobj)
+    if not sources and require_sources:
+         raise HTTPException(status_code=400, detail="No source code found in ZIP")
+    return sources
+
+def _read_zip_members(fileobj) -> Dict[str, str]:
+    sources = {}
+    total_bytes = 0
+    with zipfile.ZipFile(fileobj) as zip_ref:
+        members = sorted(zip_ref.infolist(), key=lambda info: info.filename)
+        for info in members:
+            if info.is_dir() or not _zip_member_wanted(info.filename):
+                continue
+            if len(sources) >= REVIEW_ZIP_MAX_FILES:
+                logger.warning(f"ZIP file limit reached, reviewing first {REVIEW_ZIP_MAX_FILES} files")
+                break
+            if info.file_size > REVIEW_ZIP_MAX_MEMBER_BYTES:
+                logger.warning(f"Skipping {info.filename}: {info.file_size} bytes exceeds member cap")
+                continue
+            if total_bytes + info.file_size > REVIEW_ZIP_MAX_TOTAL_BYTES:
+                logger.warning(f"ZIP size cap reached at {total_bytes} bytes, skipping remaining files")
+                break
+            with zip_ref.open(info) as member:
+                data = member.read(REVIEW_ZIP_MAX_MEMBER_BYTES + 1) # Don't trust the header size
+            if len(data) > REVIEW_ZIP_MAX_MEMBER_BYTES:
+                logger.warning(f"Skipping {info.filename}: decompresses past member cap")
+                continue
+            total_bytes += len(data)
+            sources[info.filename] = data.decode("utf-8", errors="ignore")
+
+    METRICS.inc("bytes_processed_total", total_bytes, origin="zip")
+    logger.info(f"Read {len(sources)} files ({total_bytes} bytes) from ZIP")
+    return sources
+
+def _zip_member_wanted(name: str) -> bool:
+    parts = name.split("/")
+    return is_reviewable(parts[-1]) and not any(p in ZIP_SKIP_DIRS for p in parts[:-1])
 
 @app.post("/api/review")
 async def review_single(file: UploadFile = File(...)):
     """Review a single uploaded file."""
-    global LATEST_REPORT_PATH
     try:
-        content = await file.read()
+        content = await _read_upload(file)
         source_code = content.decode("utf-8", errors="ignore")
-        language = detect_language(file.filename)
-        
-        logger.info(f"Processing single file: {file.filename} ({language})")
-        
-        # 1. Generate Review
-        review_data = generate_llm_review(source_code, file.filename, language)
-        
-        # 2. Generate PDF
-        report_id = generate_report_id()
-        pdf_filename = f"report_{report_id}.pdf"
-        output_path = os.path.join(tempfile.gettempdir(), pdf_filename)
-        
-        build_pdf_report(review_data, output_path, file.filename)
-        LATEST_REPORT_PATH = output_path
-        
-        return JSONResponse({
-            "status": "success",
-            "report_id": report_id,
-            "filename": file.filename,
-            "pdf_report": output_path,
-            "structured": review_data
-        })
+        return JSONResponse(await run_single_review(file.filename, source_code))
 
     except Exception as e:
         logger.error(f"Error in review_single: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/review-stream")
+async def review_stream(file: UploadFile = File(...)):
+    """
+    Review a single file, streaming Server-Sent Events:
+    "finding" per finding as soon as Gemini produces it, then "done" with rating and report id.
+    """
+    content = await _read_upload(file)
+    source_code = content.decode("utf-8", errors="ignore")
+    filename = file.filename
+    language = detect_language(filename)
+    logger.info(f"Streaming review: {filename} ({language})")
+
+    async def event_source():
+        try:
+            review_data = None
+            async for event in stream_llm_review(source_code, filename, language):
+                if event["type"] == "finding":
+                    yield _sse("finding", event["finding"])
+                else:
+                    review_data = event["structured"]
+
+            report_id, output_path = REPORT_STORE.new_report()
+            await build_pdf_report_async(review_data, output_path, filename)
+
+            yield _sse("done", await _store_report(report_id, {
+                "status": "success",
+                "report_id": report_id,
+                "filename": filename,
+                "pdf_report": output_path,
+                "rating": review_data.get("rating", {}),
+                "structured": review_data
+            }, filename))
+        except Exception as e:
+            logger.error(f"Error in review_stream: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/api/review-multi")
 async def review_multi(files: List[UploadFile] = File(...)):
-    """Review multiple files (POC: Reviews first file for now, expandable)."""
-    # NOTE: User requirement implied handling multi-file, but PDF generator currently designed for one structure.
-    # We will process the FIRST valid code file to ensure the flow works, as per current PDF spec.
+    """Review all uploaded files concurrently and build one combined report."""
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
-    
-    return await review_single(files[0]) 
+
+    try:
+        sources = await _read_uploads(files)
+        return JSONResponse(await run_multi_review(sources))
+
+    except Exception as e:
+        logger.error(f"Error in review_multi: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/review-zip")
 async def review_zip(zip_file: UploadFile = File(...)):
-    """Extract ZIP and review the first valid code file found."""
-    global LATEST_REPORT_PATH
+    """Extract ZIP and review every source file in it."""
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            zip_path = os.path.join(temp_dir, "upload.zip")
-            with open(zip_path, "wb") as f:
-                shutil.copyfileobj(zip_file.file, f)
-            
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-                
-            # Find first code file
-            target_file = None
-            target_content = ""
-            
-            for root, dirs, files in os.walk(temp_dir):
-                for fname in files:
-                    if fname.endswith((".py", ".js", ".java", ".cpp", ".c", ".ts")):
-                        target_file = fname
-                        with open(os.path.join(root, fname), "r", encoding="utf-8", errors="ignore") as f:
-                            target_content = f.read()
-                        break
-                if target_file: break
-            
-            if not target_file:
-                 raise HTTPException(status_code=400, detail="No source code found in ZIP")
-
-            # Reuse single review logic
-            language = detect_language(target_file)
-            review_data = generate_llm_review(target_content, target_file, language)
-            
-            report_id = generate_report_id()
-            pdf_filename = f"report_{report_id}.pdf"
-            output_path = os.path.join(tempfile.gettempdir(), pdf_filename)
-            
-            build_pdf_report(review_data, output_path, target_file)
-            LATEST_REPORT_PATH = output_path
-            
-            return JSONResponse({
-                "status": "success",
-                "report_id": report_id,
-                "filename": target_file,
-                "pdf_report": output_path,
-                "structured": review_data
-            })
+        sources = await asyncio.to_thread(extract_zip_sources, zip_file.file)
+        return JSONResponse(await run_multi_review(sources, title=f"Code Review Report: {zip_file.filename}"))
 
+    except HTTPException:
+        raise
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid ZIP file")
     except Exception as e:
         logger.error(f"Error in review_zip: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/review-diff")
+async def review_diff(diff_file: Optional[UploadFile] = File(None),
+                      base_zip: Optional[UploadFile] = File(None),
+                      head_zip: Optional[UploadFile] = File(None)):
+    """
+    Pull-request review: upload a unified diff (diff_file) or base_zip + head_zip.
+    Only changed hunks and DIFF_CONTEXT_LINES around them are sent to Gemini;
+    finding lines refer to the head version of each file.
+    """
+    try:
+        if diff_file is not None:
+            diff_text = (await _read_upload(diff_file)).decode("utf-8", errors="ignore")
+            changes = parse_unified_diff(diff_text)
+            title = f"Pull Request Review: {diff_file.filename}"
+        elif base_zip is not None and head_zip is not None:
+            base = await asyncio.to_thread(extract_zip_sources, base_zip.file, False)
+            head = await asyncio.to_thread(extract_zip_sources, head_zip.file)
+            changes = diff_sources(base, head)
+            title = f"Pull Request Review: {base_zip.filename} -> {head_zip.filename}"
+        else:
+            raise HTTPException(status_code=400, detail="Provide diff_file, or both base_zip and head_zip")
+
+        if not changes:
+            raise HTTPException(status_code=400, detail="No reviewable changes found")
+        return JSONResponse(await run_diff_review(changes, title))
+
+    except HTTPException:
+        raise
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid ZIP file")
+    except Exception as e:
+        logger.error(f"Error in review_diff: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Async jobs: POST returns a job id at once, GET /api/jobs/{id} polls ---
+
+def _submit_job(kind: str, runner, total: int) -> JSONResponse:
+    try:
+        job = JOB_QUEUE.submit(kind, runner, total)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    job["status_url"] = f"/api/jobs/{job['job_id']}"
+    return JSONResponse(job, status_code=202)
+
+@app.post("/api/jobs/review")
+async def submit_review_job(file: UploadFile = File(...)):
+    """Queue a single-file review."""
+    content = await _read_upload(file)
+    source_code = content.decode("utf-8", errors="ignore")
+    filename = file.filename
+
+    async def runner(progress):
+        result = await run_single_review(filename, source_code)
+        progress(1, 1)
+        return result
+    return _submit_job("review", runner, 1)
+
+@app.post("/api/jobs/review-multi")
+async def submit_multi_job(files: List[UploadFile] = File(...)):
+    """Queue a multi-file review."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    sources = await _read_uploads(files)
+    return _submit_job("review-multi", lambda progress: run_multi_review(sources, progress=progress), len(sources))
+
+@app.post("/api/jobs/review-zip")
+async def submit_zip_job(zip_file: UploadFile = File(...)):
+    """Queue a whole-archive review (files are read from the ZIP before returning)."""
+    try:
+        sources = await asyncio.to_thread(extract_zip_sources, zip_file.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid ZIP file")
+    title = f"Code Review Report: {zip_file.filename}"
+    return _submit_job("review-zip", lambda progress: run_multi_review(sources, title, progress), len(sources))
+
+@app.get("/api/jobs")
+def job_stats():
+    """Queue depth and worker utilisation for this worker process."""
+    return JSONResponse(JOB_QUEUE.get_stats())
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    """Job status, progress and (when done) the review result."""
+    job = JOB_QUEUE.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "done":
+        job["report_url"] = job["result"]["report_url"]
+    return JSONResponse(job)
+
+@app.get("/api/jobs/{job_id}/report")
+def job_report(job_id: str):
+    """Download the PDF produced by a finished job."""
+    job = JOB_QUEUE.get(job_id)
+    if not job or job["status"] != "done":
+        raise HTTPException(status_code=404, detail="Report not ready")
+    return get_report(job["result"]["report_id"], format="pdf")
+
+@app.get("/api/reports/{report_id}")
+def get_report(report_id: str, format: str = "json"):
+    """Fetch a stored report by id: ?format=json (default) or ?format=pdf."""
+    entry = REPORT_STORE.get(report_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if format == "pdf":
+        if not os.path.exists(entry["pdf_path"]):
+            raise HTTPException(status_code=404, detail="Report PDF missing")
+        return FileResponse(entry["pdf_path"], filename=f"review_report_{report_id}.pdf")
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or pdf")
+    payload = REPORT_STORE.load_json(report_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Report JSON missing")
+    return JSONResponse(payload)
+
 @app.get("/api/download-latest")
 def download_latest():
-    """Download the last generated PDF."""
-    global LATEST_REPORT_PATH
-    if not LATEST_REPORT_PATH or not os.path.exists(LATEST_REPORT_PATH):
+    """Download the most recently stored PDF (across all workers)."""
+    entry = REPORT_STORE.latest()
+    if not entry or not os.path.exists(entry["pdf_path"]):
         raise HTTPException(status_code=404, detail="No report generated yet.")
-    return FileResponse(LATEST_REPORT_PATH, filename="latest_review_report.pdf")
+    return FileResponse(entry["pdf_path"], filename="latest_review_report.pdf")
+
+@app.get("/api/health")
+def health():
+    """Liveness plus Gemini circuit state: "degraded" while any circuit is open (reviews fall back fast)."""
+    circuits = GEMINI_CIRCUIT.get_stats()
+    degraded = any(c["state"] != "closed" for c in circuits["circuits"].values())
+    return JSONResponse({"status": "degraded" if degraded else "ok", "gemini": circuits})
+
+@app.get("/api/pool-stats")
+def pool_stats():
+    """Gemini HTTP connection pool stats for this worker."""
+    return JSONResponse(get_pool_stats())
+
+@app.get("/api/cache-stats")
+def cache_stats():
+    """Review cache hit/miss counters and coalesced in-flight reviews for this worker."""
+    return JSONResponse({**REVIEW_CACHE.get_stats(), "single_flight": SINGLE_FLIGHT.get_stats()})
+
+@app.get("/api/rate-limit-stats")
+def rate_limit_stats():
+    """Client-side Gemini pacing stats for this worker."""
+    return JSONResponse(GEMINI_RATE_LIMITER.get_stats())
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text-format metrics for this worker."""
+    cache = REVIEW_CACHE.get_stats()
+    jobs = JOB_QUEUE.get_stats()
+    sampled = {
+        "review_cache_memory_entries": ("gauge", "Entries in the in-memory review cache", cache["memory_entries"]),
+        "review_cache_disk_bytes": ("gauge", "Bytes in the on-disk review cache", cache["disk_bytes"]),
+        "job_queue_depth": ("gauge", "Review jobs waiting for a worker", jobs["queue_depth"]),
+        "job_busy_workers": ("gauge", "Job workers currently running a review", jobs["busy_workers"]),
+        "single_flight_coalesced_total": ("counter", "Reviews that joined an identical in-flight review", SINGLE_FLIGHT.get_stats()["coalesced"]),
+        "triage_llm_calls_saved_total": ("counter", "Gemini calls avoided by local triage", TRIAGE_STATS.get_stats()["llm_calls_saved"]),
+        "context_cache_hits_total": ("counter", "Requests that reused a Gemini cachedContents handle", CONTEXT_CACHE.get_stats()["hits"]),
+        "gemini_circuits_open": ("gauge", "Gemini circuits (model/endpoint) currently open or half-open", GEMINI_CIRCUIT.open_count()),
+    }
+    return PlainTextResponse(METRICS.render(sampled), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/triage-stats")
+def triage_stats():
+    """Local triage stats for this worker, including Gemini calls saved on trivial files."""
+    return JSONResponse(TRIAGE_STATS.get_stats())
+
+@app.get("/api/compaction-stats")
+def compaction_stats():
+    """Estimated prompt tokens before/after compaction for this worker."""
+    return JSONResponse(COMPACTION_STATS.get_stats())
+
+@app.get("/api/tier-stats")
+def tier_stats():
+    """Per model tier requests, mean latency, tokens and estimated cost for this worker (for tuning the cut-offs)."""
+    return JSONResponse(MODEL_ROUTER.get_stats())
+
+@app.get("/api/hedge-stats")
+def hedge_stats():
+    """Hedged Gemini calls, remaining budget use and current hedge delays for this worker."""
+    return JSONResponse(GEMINI_HEDGER.get_stats())
+
+@app.get("/api/context-cache-stats")
+def context_cache_stats():
+    """Gemini cachedContents handles for the fixed review instruction, for this worker."""
+    return JSONResponse(CONTEXT_CACHE.get_stats())
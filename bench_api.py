@@ -0,0 +1,161 @@
+"""
+Benchmark: review endpoint throughput and latency against a local fake Gemini (no quota used).
+
+Starts fake_gemini.py in-process, points the app at it (GEMINI_BASE_URL) and drives
+/api/review, /api/review-multi and /api/review-zip through the ASGI app with the
+"Upload files" samples as the corpus. The review cache is off by default so every
+request reaches the (fake) model.
+
+Usage: python bench_api.py [--requests 40] [--concurrency 8] [--latency-ms 800] [--latency-sigma 0.5]
+                           [--rate-429 0] [--rate-500 0] [--malformed 0] [--truncated 0] [--cache]
+                           [--endpoints review,review-multi,review-zip] [--out bench_api.json]
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import zipfile
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+from fake_gemini import FakeGeminiConfig, start_fake_gemini
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Upload files")
+
+def load_corpus(folder: str):
+    corpus = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                corpus[name] = f.read()
+    return corpus
+
+def make_zip(corpus) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in corpus.items():
+            zf.writestr(f"project/{name}", data)
+    return buf.getvalue()
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[idx]
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+async def run_endpoint(client, endpoint: str, corpus, zip_bytes: bytes, requests: int, concurrency: int):
+    names = [n for n in corpus]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def one(i: int):
+        if endpoint == "review":
+            name = names[i % len(names)]
+            files = {"file": (name, corpus[name])}
+        elif endpoint == "review-multi":
+            files = [("files", (name, data)) for name, data in corpus.items()]
+        else:
+            files = {"zip_file": ("corpus.zip", zip_bytes)}
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await client.post(f"/api/{endpoint}", files=files)
+            latencies.append((time.perf_counter() - start) * 1000)
+        statuses[str(resp.status_code)] = statuses.get(str(resp.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": f"/api/{endpoint}",
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_ms_p50": round(percentile(latencies, 50), 1),
+        "latency_ms_p95": round(percentile(latencies, 95), 1),
+        "latency_ms_p99": round(percentile(latencies, 99), 1),
+        "latency_ms_mean": round(statistics.mean(latencies), 1) if latencies else 0.0,
+        "status_codes": statuses,
+    }
+
+async def main(args):
+    config = FakeGeminiConfig(args.latency_ms, args.latency_sigma, args.rate_429, args.malformed, args.truncated, args.seed, args.rate_500)
+    server, base_url = start_fake_gemini(config)
+
+    # The app reads its configuration at import time
+    os.environ["GEMINI_BASE_URL"] = base_url
+    os.environ.setdefault("GEMINI_API_KEY", "bench-fake-key")
+    os.environ["REVIEW_CACHE_ENABLED"] = "true" if args.cache else "false"
+    os.environ.setdefault("REPORT_STORE_DIR", tempfile.mkdtemp(prefix="bench_reports_"))
+    os.environ.setdefault("GEMINI_RATE_LIMIT_DB", "memory")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import httpx
+    import app as review_app
+    import llm_agent
+    if not llm_agent.API_URL_TEMPLATE.startswith(base_url):
+        raise SystemExit("GEMINI_BASE_URL was overridden (check .env); refusing to benchmark against the real API")
+
+    corpus = load_corpus(args.corpus)
+    zip_bytes = make_zip(corpus)
+    for handler in review_app.app.router.on_startup:
+        await handler()
+
+    results = []
+    transport = httpx.ASGITransport(app=review_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for endpoint in args.endpoints.split(","):
+            result = await run_endpoint(client, endpoint.strip(), corpus, zip_bytes, args.requests, args.concurrency)
+            results.append(result)
+            print(f"{result['endpoint']:>18}: {result['requests_per_second']} req/s | p50 {result['latency_ms_p50']} ms, "
+                  f"p95 {result['latency_ms_p95']} ms, p99 {result['latency_ms_p99']} ms | {result['status_codes']}")
+
+    for handler in review_app.app.router.on_shutdown:
+        await handler()
+    server.shutdown()
+
+    with config.lock:
+        gemini_stats = dict(config.stats)
+    with open(args.out, "w") as f:
+        json.dump({
+            "benchmark": "api",
+            "commit": git_commit(),
+            "corpus_files": len(corpus),
+            "fake_gemini": {
+                "latency_ms": args.latency_ms, "latency_sigma": args.latency_sigma, "rate_429": args.rate_429, "rate_500": args.rate_500,
+                "malformed": args.malformed, "truncated": args.truncated, "counts": gemini_stats,
+            },
+            "cache": args.cache,
+            "results": results,
+        }, f, indent=2)
+    print(f"Saved {args.out}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Review API benchmark against a fake Gemini")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", default="review,review-multi,review-zip")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Note: each 429 costs the app a 20 s+ backoff")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Outage simulation; exercises the circuit breaker")
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--truncated", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="Leave the review cache on")
+    parser.add_argument("--out", default="bench_api.json")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,109 @@
+"""
+Benchmark: API responsiveness while PDF-heavy reviews are in flight.
+
+Runs the same load twice on one event loop:
+  inline - build_pdf_report called directly in the coroutine (old behaviour)
+  pool   - build_pdf_report_async (process pool)
+and measures the latency of a trivial "request" probe that ticks every 10 ms.
+
+Usage: python bench_pdf.py [--reports 16] [--findings 300] [--workers 2] [--out bench_pdf.json]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+import pdf_report
+
+def make_review(findings: int):
+    return {
+        "summary_markdown": "## Summary\n\nBenchmark review with many findings.",
+        "findings": [
+            {
+                "id": f"F{i:03d}",
+                "title": f"Finding {i}",
+                "description": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+                "severity": ("critical", "high", "medium", "low", "info")[i % 5],
+                "line": i,
+                "recommendation": "Refactor this block and add tests. " * 2,
+                "category": "maintainability"
+            }
+            for i in range(findings)
+        ],
+        "rating": {"quality": 6.0, "security": 7.0, "maintainability": 5.5, "overall": 6.2}
+    }
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[idx]
+
+async def run_mode(mode: str, reports: int, review, out_dir: str):
+    latencies = []
+    stop = asyncio.Event()
+
+    async def probe():
+        # Stand-in for an unrelated request: should be served within ~10 ms
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            latencies.append((time.perf_counter() - start - 0.01) * 1000)
+
+    async def report_request(i: int):
+        path = os.path.join(out_dir, f"{mode}_{i}.pdf")
+        if mode == "inline":
+            pdf_report.build_pdf_report(review, path, "bench.py")
+        else:
+            await pdf_report.build_pdf_report_async(review, path, "bench.py")
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*[report_request(i) for i in range(reports)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    return {
+        "mode": mode,
+        "reports": reports,
+        "wall_seconds": round(elapsed, 3),
+        "reports_per_second": round(reports / elapsed, 2),
+        "probe_samples": len(latencies),
+        "probe_lag_ms_p50": round(percentile(latencies, 50), 2),
+        "probe_lag_ms_p95": round(percentile(latencies, 95), 2),
+        "probe_lag_ms_p99": round(percentile(latencies, 99), 2),
+        "probe_lag_ms_max": round(max(latencies, default=0.0), 2),
+        "probe_lag_ms_mean": round(statistics.mean(latencies), 2) if latencies else 0.0,
+    }
+
+async def main(args):
+    pdf_report.PDF_POOL_WORKERS = args.workers
+    review = make_review(args.findings)
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        results.append(await run_mode("inline", args.reports, review, out_dir))
+        await pdf_report.warm_pdf_pool()
+        results.append(await run_mode("pool", args.reports, review, out_dir))
+        pdf_report.shutdown_pdf_pool()
+
+    for r in results:
+        print(f"{r['mode']:>6}: {r['wall_seconds']}s for {r['reports']} reports | "
+              f"probe lag p50 {r['probe_lag_ms_p50']} ms, p99 {r['probe_lag_ms_p99']} ms, max {r['probe_lag_ms_max']} ms")
+
+    with open(args.out, "w") as f:
+        json.dump({"benchmark": "pdf_pool", "findings": args.findings, "workers": args.workers, "results": results}, f, indent=2)
+    print(f"Saved {args.out}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF rendering event-loop benchmark")
+    parser.add_argument("--reports", type=int, default=16)
+    parser.add_argument("--findings", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--out", default="bench_pdf.json")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,259 @@
+import ast
+import re
+from typing import Dict, Any, List, Tuple
+from utils import get_logger, as_int, as_float, RATING_KEYS
+
+logger = get_logger("Chunker")
+
+HEADER_MAX_CHARS = 2000
+
+# Languages whose blocks are delimited by braces
+BRACE_LANGUAGES = {"javascript", "typescript", "react", "java", "c", "cpp", "csharp", "go", "rust", "php", "css"}
+
+IMPORT_LINE = re.compile(r"^\s*(#include\b|#import\b|import\b|using\b|package\b|use\b|require\b|from\s+\S+\s+import\b|const\s+\w+\s*=\s*require\()")
+STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|//.*$')
+
+def split_source(source_code: str, language: str, max_chars: int) -> List[Dict[str, Any]]:
+    """
+    Split a source file into chunks of at most ~max_chars on function/class boundaries.
+    Each chunk: {"start_line", "end_line" (1-based, inclusive), "text", "header"}.
+    "header" holds the file's imports and signatures so each chunk can be reviewed alone.
+    """
+    lines = source_code.splitlines(keepends=True)
+    if not lines:
+        return [{"start_line": 1, "end_line": 1, "text": source_code, "header": ""}]
+
+    if language == "python":
+        try:
+            units, header = _python_units(source_code, lines, max_chars)
+        except SyntaxError:
+            units, header = _indent_units(lines), _header_from_lines(lines)
+    elif language in BRACE_LANGUAGES:
+        units, header = _brace_units(lines)
+    else:
+        units, header = _indent_units(lines), _header_from_lines(lines)
+
+    chunks = []
+    for start, end in pack_units(units, lines, max_chars):
+        chunks.append({
+            "start_line": start,
+            "end_line": end,
+            "text": "".join(lines[start - 1:end]),
+            "header": header,
+        })
+    return chunks
+
+def split_units(source_code: str, language: str, min_lines: int = 5, class_split_chars: int = 4000) -> Tuple[List[Tuple[int, int]], str]:
+    """
+    Top-level units (functions, classes, or runs of small statements) as (start, end) line ranges,
+    plus the file header. Units shorter than min_lines are merged with their neighbours;
+    classes over class_split_chars are split into their members.
+    """
+    lines = source_code.splitlines(keepends=True)
+    if not lines:
+        return [], ""
+    if language == "python":
+        try:
+            units, header = _python_units(source_code, lines, class_split_chars)
+        except SyntaxError:
+            units, header = _indent_units(lines), _header_from_lines(lines)
+    elif language in BRACE_LANGUAGES:
+        units, header = _brace_units(lines)
+    else:
+        units, header = _indent_units(lines), _header_from_lines(lines)
+
+    merged = []
+    group_start = None
+    for start, end in units:
+        if group_start is None:
+            group_start = start
+        if end - group_start + 1 >= min_lines:
+            merged.append((group_start, end))
+            group_start = None
+    if group_start is not None:
+        if merged:
+            merged[-1] = (merged[-1][0], len(lines))
+        else:
+            merged.append((group_start, len(lines)))
+    return merged, header
+
+def source_header(source_code: str, language: str) -> str:
+    """Imports and signatures of a file (the shared header attached to every chunk)."""
+    return split_source(source_code, language, max(len(source_code), 1))[0]["header"]
+
+def pack_units(units: List[Tuple[int, int]], lines: List[str], max_chars: int) -> List[Tuple[int, int]]:
+    """Greedily merge consecutive units up to max_chars; split oversized units into line windows."""
+    chunks = []
+    cur_start, cur_end, cur_size = None, None, 0
+    for start, end in units:
+        size = _span_chars(lines, start, end)
+        if cur_start is not None and cur_size + size > max_chars:
+            chunks.append((cur_start, cur_end))
+            cur_start, cur_size = None, 0
+        if size > max_chars:
+            chunks.extend(_line_windows(lines, start, end, max_chars))
+            continue
+        if cur_start is None:
+            cur_start = start
+        cur_end = end
+        cur_size += size
+    if cur_start is not None:
+        chunks.append((cur_start, cur_end))
+    return chunks
+
+def merge_chunk_reviews(chunks: List[Dict[str, Any]], results: List[Dict[str, Any]], filename: str) -> Dict[str, Any]:
+    """
+    Combine per-chunk reviews into one review for the whole file.
+    Finding lines are shifted back to file line numbers. Chunks never overlap, so every finding is kept.
+    """
+    findings = []
+    summaries = []
+    totals = {k: 0.0 for k in RATING_KEYS}
+    weight_sum = 0
+
+    for chunk, result in zip(chunks, results):
+        offset = chunk["start_line"] - 1
+        for f in result.get("findings", []):
+            f = dict(f)
+            line = as_int(f.get("line"))
+            if line > 0:
+                line += offset
+            f["line"] = line
+            findings.append(f)
+
+        summary = result.get("summary_markdown", "").replace("## Summary", "").strip()
+        if summary:
+            summaries.append(f"**Lines {chunk['start_line']}-{chunk['end_line']}:** {summary}")
+
+        rating = result.get("rating", {})
+        values = {k: as_float(rating.get(k)) for k in RATING_KEYS}
+        if any(values.values()): # All-zero ratings come from fallbacks
+            weight = chunk["end_line"] - chunk["start_line"] + 1
+            weight_sum += weight
+            for k in RATING_KEYS:
+                totals[k] += values[k] * weight
+
+    findings.sort(key=lambda f: as_int(f.get("line")))
+    for i, f in enumerate(findings, 1):
+        if f.get("category") != "infrastructure":
+            f["id"] = f"F{i:03d}"
+
+    header = f"## Summary\n\n`{filename}` was reviewed in {len(chunks)} parts.\n\n"
+    return {
+        "summary_markdown": header + "\n\n".join(summaries),
+        "findings": findings,
+        "rating": {k: round(totals[k] / weight_sum, 1) if weight_sum else 0.0 for k in RATING_KEYS},
+    }
+
+# --- Unit detection: each returns contiguous (start, end) line ranges covering the file ---
+
+def _python_units(source_code: str, lines: List[str], max_chars: int) -> Tuple[List[Tuple[int, int]], str]:
+    tree = ast.parse(source_code)
+    header_lines = []
+    starts = []
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        starts.append((start, node))
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            header_lines.extend(l.rstrip() for l in lines[node.lineno - 1:node.end_lineno])
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            header_lines.append(lines[node.lineno - 1].rstrip())
+            if isinstance(node, ast.ClassDef):
+                for child in node.body:
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        header_lines.append(lines[child.lineno - 1].rstrip())
+
+    units = []
+    for i, (start, node) in enumerate(starts):
+        start = 1 if i == 0 else start
+        end = starts[i + 1][0] - 1 if i + 1 < len(starts) else len(lines)
+        if isinstance(node, ast.ClassDef) and _span_chars(lines, start, end) > max_chars and node.body:
+            # Oversized class: split on its members instead
+            member_starts = [min([c.lineno] + [d.lineno for d in getattr(c, "decorator_list", [])]) for c in node.body]
+            member_starts[0] = start
+            for j, ms in enumerate(member_starts):
+                me = member_starts[j + 1] - 1 if j + 1 < len(member_starts) else end
+                units.append((ms, me))
+        else:
+            units.append((start, end))
+    if not units:
+        units = [(1, len(lines))]
+    return units, _clip_header(header_lines)
+
+def _brace_units(lines: List[str]) -> Tuple[List[Tuple[int, int]], str]:
+    """A unit boundary is any line that starts at brace depth 0."""
+    depth = 0
+    in_block_comment = False
+    boundaries = []
+    header_lines = []
+    for i, raw in enumerate(lines, 1):
+        if depth == 0 and not in_block_comment:
+            boundaries.append(i)
+            if IMPORT_LINE.match(raw):
+                header_lines.append(raw.rstrip())
+        code, in_block_comment = _strip_comments(raw, in_block_comment)
+        if depth == 0 and "{" in code:
+            signature = code.split("{", 1)[0].strip()
+            if signature:
+                header_lines.append(signature)
+        depth = max(depth + code.count("{") - code.count("}"), 0)
+
+    units = []
+    for j, start in enumerate(boundaries):
+        end = boundaries[j + 1] - 1 if j + 1 < len(boundaries) else len(lines)
+        units.append((start, end))
+    return units, _clip_header(header_lines)
+
+def _indent_units(lines: List[str]) -> List[Tuple[int, int]]:
+    """Fallback: a unit starts at each non-blank line with no indentation."""
+    boundaries = [1]
+    for i, raw in enumerate(lines, 1):
+        if i > 1 and raw.strip() and not raw[0].isspace() and raw.lstrip()[0] not in ")]}":
+            boundaries.append(i)
+    return [(start, (boundaries[j + 1] - 1 if j + 1 < len(boundaries) else len(lines))) for j, start in enumerate(boundaries)]
+
+def _header_from_lines(lines: List[str]) -> str:
+    return _clip_header([l.rstrip() for l in lines if IMPORT_LINE.match(l)])
+
+# --- Helpers ---
+
+def _line_windows(lines: List[str], start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    windows = []
+    win_start, size = start, 0
+    for i in range(start, end + 1):
+        line_len = len(lines[i - 1])
+        if size and size + line_len > max_chars:
+            windows.append((win_start, i - 1))
+            win_start, size = i, 0
+        size += line_len
+    windows.append((win_start, end))
+    return windows
+
+def _span_chars(lines: List[str], start: int, end: int) -> int:
+    return sum(len(l) for l in lines[start - 1:end])
+
+def _strip_comments(line: str, in_block_comment: bool) -> Tuple[str, bool]:
+    """Drop string literals and comments so braces inside them aren't counted."""
+    out = ""
+    rest = line
+    while rest:
+        if in_block_comment:
+            idx = rest.find("*/")
+            if idx < 0:
+                return out, True
+            rest = rest[idx + 2:]
+            in_block_comment = False
+        idx = rest.find("/*")
+        if idx < 0:
+            out += rest
+            break
+        out += rest[:idx]
+        rest = rest[idx + 2:]
+        in_block_comment = True
+    return STRING_OR_COMMENT.sub("", out), in_block_comment
+
+def _clip_header(header_lines: List[str]) -> str:
+    header = "\n".join(header_lines)
+    if len(header) > HEADER_MAX_CHARS:
+        header = header[:HEADER_MAX_CHARS].rsplit("\n", 1)[0] + "\n..."
+    return header
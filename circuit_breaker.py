@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from typing import Dict, Any, Tuple
+from utils import get_logger, env_flag
+from metrics import METRICS
+
+logger = get_logger("CircuitBreaker")
+
+# Configuration
+GEMINI_BREAKER = env_flag("GEMINI_BREAKER", True)
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5")) # Consecutive failures that open the circuit
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30")) # Seconds open before a probe
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker per (model, endpoint).
+    GEMINI_BREAKER_FAILURES consecutive backend failures (network errors, 429, 401/403, 5xx) open the circuit:
+    calls are refused without touching the network until the cooldown passes. Then one probe call is let
+    through (half-open); its success closes the circuit, its failure reopens it for another cooldown.
+    """
+
+    def __init__(self, failures: int, cooldown: float, enabled: bool = True):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._circuits: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def allow(self, model: str, endpoint: str) -> bool:
+        """True if a call may go out now. In half-open, only the first caller (the probe) gets True."""
+        if not self.enabled:
+            return True
+        key = (model, endpoint)
+        with self._lock:
+            c = self._circuit(key)
+            if c["state"] == CLOSED:
+                return True
+            if c["state"] == OPEN and time.time() - c["opened_at"] >= self.cooldown:
+                self._transition(key, c, HALF_OPEN)
+            if c["state"] == HALF_OPEN and not c["probing"]:
+                c["probing"] = True
+                logger.info(f"Circuit {model}/{endpoint} half-open: sending one probe")
+                return True
+            c["rejected"] += 1
+        METRICS.inc("gemini_circuit_rejected_total", model=model, endpoint=endpoint)
+        return False
+
+    def record(self, model: str, endpoint: str, ok: bool):
+        """Outcome of a call that allow() let through."""
+        if not self.enabled:
+            return
+        key = (model, endpoint)
+        with self._lock:
+            c = self._circuit(key)
+            c["probing"] = False
+            if ok:
+                c["consecutive_failures"] = 0
+                if c["state"] != CLOSED:
+                    self._transition(key, c, CLOSED)
+                return
+            c["consecutive_failures"] += 1
+            c["failures"] += 1
+            if c["state"] == HALF_OPEN or (c["state"] == CLOSED and c["consecutive_failures"] >= self.failures):
+                c["opened_at"] = time.time()
+                self._transition(key, c, OPEN)
+
+    def release(self, model: str, endpoint: str):
+        """A let-through call ended without an outcome (cancelled): free the probe slot."""
+        with self._lock:
+            c = self._circuits.get((model, endpoint))
+            if c:
+                c["probing"] = False
+
+    def is_open(self, model: str, endpoint: str) -> bool:
+        """Open and still cooling down (retrying now would be refused)."""
+        with self._lock:
+            c = self._circuits.get((model, endpoint))
+            return bool(c) and c["state"] == OPEN and time.time() - c["opened_at"] < self.cooldown
+
+    def reason(self, model: str, endpoint: str) -> str:
+        with self._lock:
+            c = self._circuit((model, endpoint))
+            wait = max(self.cooldown - (time.time() - c["opened_at"]), 0)
+            failures = c["consecutive_failures"]
+        return (f"Gemini unavailable: circuit open for {model} {endpoint} after {failures} consecutive failures "
+                f"(next probe in {wait:.0f}s)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            circuits = {
+                f"{model}/{endpoint}": {
+                    "state": c["state"],
+                    "consecutive_failures": c["consecutive_failures"],
+                    "failures": c["failures"],
+                    "rejected": c["rejected"],
+                    "open_for": round(now - c["opened_at"], 1) if c["state"] != CLOSED else 0.0,
+                }
+                for (model, endpoint), c in self._circuits.items()
+            }
+        return {"enabled": self.enabled, "failures_to_open": self.failures, "cooldown": self.cooldown, "circuits": circuits}
+
+    def open_count(self) -> int:
+        with self._lock:
+            return sum(1 for c in self._circuits.values() if c["state"] != CLOSED)
+
+    def _circuit(self, key: Tuple[str, str]) -> Dict[str, Any]:
+        c = self._circuits.get(key)
+        if c is None:
+            c = self._circuits[key] = {"state": CLOSED, "consecutive_failures": 0, "failures": 0,
+                                       "rejected": 0, "opened_at": 0.0, "probing": False}
+        return c
+
+    def _transition(self, key: Tuple[str, str], c: Dict[str, Any], state: str):
+        # Called with the lock held
+        c["state"] = state
+        METRICS.inc("gemini_circuit_transitions_total", model=key[0], endpoint=key[1], state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit {key[0]}/{key[1]} -> {state}")
+
+GEMINI_CIRCUIT = CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN, GEMINI_BREAKER)
@@ -0,0 +1,183 @@
+import io
+import os
+import bisect
+import re
+import tokenize
+from typing import Dict, Any, List, Optional, Set, Tuple
+from utils import get_logger, env_flag, StatsCounter
+from metrics import METRICS
+from rate_limiter import estimate_tokens
+
+logger = get_logger("Compactor")
+
+# Configuration
+PROMPT_COMPACTION = env_flag("PROMPT_COMPACTION", True)
+COMPACT_COMMENT_MAX_LINES = int(os.getenv("COMPACT_COMMENT_MAX_LINES", "4")) # Longer comment runs are cut
+GEMINI_MIN_OUTPUT_TOKENS = int(os.getenv("GEMINI_MIN_OUTPUT_TOKENS", "2048")) # 2.5 models spend part of this on thinking
+GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "4000"))
+
+LICENSE_MARKERS = re.compile(r"copyright|licen[cs]e|spdx|all rights reserved|permission is hereby granted", re.IGNORECASE)
+# Comments a reviewer should still see (suppressions, TODOs)
+KEEP_MARKERS = re.compile(r"TODO|FIXME|XXX|HACK|noqa|nosec|type:\s*ignore|eslint|pylint|NOLINT|@ts-|SAFETY", re.IGNORECASE)
+
+# language -> (line comment prefixes, block comment (open, close) or None)
+COMMENT_SYNTAX = {
+    "ruby": (("#",), None),
+    "php": (("//", "#"), ("/*", "*/")),
+    "sql": (("--",), ("/*", "*/")),
+    "html": ((), ("<!--", "-->")),
+    "css": ((), ("/*", "*/")),
+}
+C_STYLE = (("//",), ("/*", "*/"))
+C_STYLE_LANGUAGES = {"javascript", "typescript", "react", "java", "c", "cpp", "csharp", "go", "rust"}
+
+class CompactionStats(StatsCounter):
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["saved_ratio"] = round(stats["tokens_saved"] / stats["tokens_before"], 3) if stats["tokens_before"] else 0.0
+        return stats
+
+COMPACTION_STATS = CompactionStats("requests", "tokens_before", "tokens_after", "tokens_saved")
+
+def compact_source(source_code: str, filename: str, language: str) -> Tuple[str, List[int]]:
+    """
+    Drop low-value text before the prompt is built: a leading license header, the middle of long
+    comment blocks, trailing whitespace and runs of blank lines.
+    Returns (compacted source, line map) where line_map[i] is the original line of compacted line i + 1
+    (see remap_findings). Records estimated tokens before/after in COMPACTION_STATS.
+    """
+    lines = source_code.splitlines()
+    comments = {i for i in _comment_lines(source_code, lines, language) if not KEEP_MARKERS.search(lines[i])}
+    dropped = _license_header(lines, comments)
+
+    # 1. Long comment runs keep their first lines and their last (closing) line
+    run: List[int] = []
+    for i in range(len(lines) + 1):
+        if i < len(lines) and i in comments and i not in dropped:
+            run.append(i)
+            continue
+        if len(run) > COMPACT_COMMENT_MAX_LINES:
+            dropped.update(run[COMPACT_COMMENT_MAX_LINES - 1:-1])
+        run = []
+
+    # 2. Trailing whitespace and blank-line runs
+    out: List[str] = []
+    line_map: List[int] = []
+    for i, line in enumerate(lines):
+        if i in dropped:
+            continue
+        line = line.rstrip()
+        if not line and (not out or not out[-1]):
+            continue
+        out.append(line)
+        line_map.append(i + 1)
+    while out and not out[-1]:
+        out.pop()
+        line_map.pop()
+
+    compacted = "\n".join(out) + ("\n" if out and source_code.endswith("\n") else "")
+    before, after = estimate_tokens(source_code), estimate_tokens(compacted)
+    COMPACTION_STATS.inc(requests=1, tokens_before=before, tokens_after=after, tokens_saved=before - after)
+    METRICS.inc("prompt_tokens_saved_total", before - after)
+    if before > after:
+        logger.info(f"Compacted {filename}: ~{before} -> ~{after} tokens ({len(lines)} -> {len(out)} lines)")
+    return compacted, line_map
+
+def remap_line(line: Any, line_map: Optional[List[int]]) -> Any:
+    """Compacted line number -> original line number (0 and non-numbers pass through)."""
+    if not line_map:
+        return line
+    try:
+        n = int(line)
+    except (TypeError, ValueError):
+        return line
+    if n <= 0:
+        return n
+    return line_map[min(n, len(line_map)) - 1]
+
+def compacted_line(line: Any, line_map: Optional[List[int]]) -> Any:
+    """Inverse of remap_line: original line number -> compacted line (a dropped line maps to the next kept one)."""
+    if not line_map:
+        return line
+    try:
+        n = int(line)
+    except (TypeError, ValueError):
+        return line
+    if n <= 0:
+        return n
+    return min(bisect.bisect_left(line_map, n), len(line_map) - 1) + 1
+
+def remap_findings(result: Dict[str, Any], line_map: Optional[List[int]]) -> Dict[str, Any]:
+    """Point a review of compacted source back at the original lines (in place)."""
+    for f in result.get("findings", []):
+        if isinstance(f, dict) and "line" in f:
+            f["line"] = remap_line(f["line"], line_map)
+    return result
+
+def output_token_budget(input_tokens: int) -> int:
+    """maxOutputTokens for a file of ~input_tokens: small files get the floor, large ones the cap."""
+    return max(GEMINI_MIN_OUTPUT_TOKENS, min(GEMINI_MIN_OUTPUT_TOKENS + input_tokens, GEMINI_MAX_OUTPUT_TOKENS))
+
+def _license_header(lines: List[str], comments: Set[int]) -> Set[int]:
+    """Indexes of a leading comment block that reads like a license (after any shebang and blank lines)."""
+    i = 1 if lines and lines[0].startswith("#!") else 0
+    while i < len(lines) and not lines[i].strip():
+        i += 1
+    block = []
+    while i < len(lines) and i in comments:
+        block.append(i)
+        i += 1
+    if block and LICENSE_MARKERS.search("\n".join(lines[j] for j in block)):
+        return set(block)
+    return set()
+
+def _comment_lines(source_code: str, lines: List[str], language: str) -> Set[int]:
+    """0-based indexes of lines that hold nothing but comment text."""
+    if language == "python":
+        try:
+            return _python_comment_lines(source_code)
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            pass
+        prefixes, block = ("#",), None
+    elif language in C_STYLE_LANGUAGES:
+        prefixes, block = C_STYLE
+    elif language in COMMENT_SYNTAX:
+        prefixes, block = COMMENT_SYNTAX[language]
+    else:
+        return set()
+
+    found = set()
+    close = None # Set while inside a block comment
+    for i, line in enumerate(lines):
+        s = line.strip()
+        if close:
+            end = s.find(close)
+            if end < 0 or not s[end + len(close):].strip():
+                found.add(i)
+            if end >= 0:
+                close = None
+            continue
+        if s.startswith("#!") or not s:
+            continue
+        if any(s.startswith(p) for p in prefixes):
+            found.add(i)
+        elif block and s.startswith(block[0]):
+            end = s.find(block[1], len(block[0]))
+            if end < 0:
+                found.add(i)
+                close = block[1]
+            elif not s[end + len(block[1]):].strip():
+                found.add(i)
+    return found
+
+def _python_comment_lines(source_code: str) -> Set[int]:
+    # tokenize keeps "#" inside strings out of the way
+    comment_rows, code_rows = set(), set()
+    skip = (tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER)
+    for tok in tokenize.generate_tokens(io.StringIO(source_code).readline):
+        if tok.type == tokenize.COMMENT:
+            if not (tok.start[0] == 1 and tok.string.startswith("#!")):
+                comment_rows.add(tok.start[0])
+        elif tok.type not in skip:
+            code_rows.update(range(tok.start[0], tok.end[0] + 1))
+    return {row - 1 for row in comment_rows - code_rows}
@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+from typing import Dict, Any, Optional, Tuple
+import httpx
+from utils import get_logger, env_flag
+
+logger = get_logger("ContextCache")
+
+# Configuration
+GEMINI_CONTEXT_CACHE = env_flag("GEMINI_CONTEXT_CACHE", False)
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600")) # Seconds
+GEMINI_CONTEXT_CACHE_REFRESH = int(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH", "300")) # Recreate this long before expiry
+GEMINI_CONTEXT_CACHE_RETRY = int(os.getenv("GEMINI_CONTEXT_CACHE_RETRY", "3600")) # Back-off after a rejected create
+
+class ContextCache:
+    """
+    Gemini cachedContents handles for the fixed system instruction, one per (model, prompt version).
+    Handles are created on first use and recreated GEMINI_CONTEXT_CACHE_REFRESH seconds before the TTL runs out.
+    If the API rejects the create (e.g. the instruction is under the model's minimum cacheable size),
+    callers get None and send the instruction inline until the back-off passes.
+    """
+
+    def __init__(self, ttl: int, refresh: int, retry_after: int, enabled: bool = True):
+        self.ttl = ttl
+        self.refresh = refresh
+        self.retry_after = retry_after
+        self.enabled = enabled
+        self._handles: Dict[Tuple[str, str], Tuple[str, float]] = {} # (model, version) -> (name, expires at)
+        self._rejected: Dict[Tuple[str, str], float] = {} # (model, version) -> retry at
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._loop = None
+        self.stats = {"created": 0, "refreshed": 0, "rejected": 0, "invalidated": 0, "hits": 0}
+
+    async def get(self, client: httpx.AsyncClient, base_url: str, api_key: str, model: str,
+                  version: str, instruction: str) -> Optional[str]:
+        """cachedContents/... name for this instruction, or None to send it inline."""
+        if not self.enabled:
+            return None
+        key = (model, version)
+        now = time.time()
+        handle = self._handles.get(key)
+        if handle and handle[1] - now > self.refresh:
+            self.stats["hits"] += 1
+            return handle[0]
+        if self._rejected.get(key, 0) > now:
+            return None
+
+        async with self._lock(key):
+            handle = self._handles.get(key) # Another caller may have created it while we waited
+            if handle and handle[1] - time.time() > self.refresh:
+                self.stats["hits"] += 1
+                return handle[0]
+            name = await self._create(client, base_url, api_key, model, version, instruction)
+            if name is None:
+                self._rejected[key] = time.time() + self.retry_after
+                self.stats["rejected"] += 1
+                return handle[0] if handle and handle[1] > time.time() else None
+            self.stats["refreshed" if handle else "created"] += 1
+            self._handles[key] = (name, time.time() + self.ttl)
+            return name
+
+    def invalidate(self, model: str, version: str):
+        """Forget a handle the API no longer accepts (deleted or expired server-side)."""
+        if self._handles.pop((model, version), None):
+            self.stats["invalidated"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "handles": {f"{m}:{v}": {"name": name, "expires_in": round(exp - now)} for (m, v), (name, exp) in self._handles.items()},
+        }
+
+    async def _create(self, client: httpx.AsyncClient, base_url: str, api_key: str, model: str,
+                      version: str, instruction: str) -> Optional[str]:
+        body = {
+            "model": f"models/{model}",
+            "displayName": f"code-review-{version}",
+            "systemInstruction": {"parts": [{"text": instruction}]},
+            "ttl": f"{self.ttl}s",
+        }
+        try:
+            resp = await client.post(f"{base_url}/v1beta/cachedContents?key={api_key}", json=body)
+        except httpx.HTTPError as e:
+            logger.warning(f"Context cache create failed: {e}")
+            return None
+        if resp.status_code != 200:
+            logger.warning(f"Context cache rejected ({resp.status_code}): {resp.text[:200]}. Sending instruction inline")
+            return None
+        name = resp.json().get("name")
+        logger.info(f"Context cache {name} ready for {model} (prompt {version}, ttl {self.ttl}s)")
+        return name
+
+    def _lock(self, key: Tuple[str, str]) -> asyncio.Lock:
+        # Locks belong to one event loop; scripts using asyncio.run get a fresh loop per call
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._locks = {}
+        return self._locks.setdefault(key, asyncio.Lock())
+
+CONTEXT_CACHE = ContextCache(GEMINI_CONTEXT_CACHE_TTL, GEMINI_CONTEXT_CACHE_REFRESH, GEMINI_CONTEXT_CACHE_RETRY, GEMINI_CONTEXT_CACHE)
@@ -0,0 +1,120 @@
+import os
+import re
+import difflib
+from typing import Dict, Any, List, Set
+from utils import get_logger, is_reviewable, detect_language
+from chunker import source_header
+
+logger = get_logger("DiffReview")
+
+# Unchanged lines kept on each side of a change
+DIFF_CONTEXT_LINES = int(os.getenv("DIFF_CONTEXT_LINES", "10"))
+DIFF_SEGMENT_CHARS = int(os.getenv("DIFF_SEGMENT_CHARS", "20000"))
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# A "file change" is {"lines": {head line no: text}, "changed": set of head line nos, "header": str, "total_lines": int}
+
+def parse_unified_diff(diff_text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse a unified diff (git diff / diff -u) into head-side lines per file.
+    Only the lines present in hunks are known, so context is limited to the diff's own (-U) context.
+    Deleted and non-reviewable files are skipped.
+    """
+    files = {}
+    current = None
+    new_line = old_left = new_left = 0
+    for raw in diff_text.splitlines():
+        if old_left > 0 or new_left > 0:
+            # Inside a hunk: line counts decide, so "--- x" / "+++ x" content isn't mistaken for headers
+            marker, text = (raw[0], raw[1:]) if raw else (" ", "")
+            if marker == "\\":
+                continue
+            if marker in " +":
+                if current is not None:
+                    current["lines"][new_line] = text
+                    if marker == "+":
+                        current["changed"].add(new_line)
+                new_line += 1
+                new_left -= 1
+            if marker in " -":
+                if marker == "-" and current is not None:
+                    current["changed"].add(new_line) # Deletion site: flag the line that now sits there
+                old_left -= 1
+            continue
+
+        match = HUNK_HEADER.match(raw)
+        if match:
+            old_left = int(match.group(2)) if match.group(2) is not None else 1
+            new_line = int(match.group(3))
+            new_left = int(match.group(4)) if match.group(4) is not None else 1
+        elif raw.startswith("+++ "):
+            path = raw[4:].split("\t", 1)[0].strip()
+            if path == "/dev/null":
+                current = None
+                continue
+            path = path[2:] if path.startswith(("b/", "a/")) else path
+            current = files.setdefault(path, {"lines": {}, "changed": set(), "header": "", "total_lines": 0}) if is_reviewable(path) else None
+
+    for change in files.values():
+        change["changed"] &= set(change["lines"])
+        change["total_lines"] = max(change["lines"], default=0)
+    return {path: change for path, change in files.items() if change["changed"]}
+
+def diff_sources(base: Dict[str, str], head: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """Changes between two {path: source} trees (e.g. base ZIP and head ZIP), with full head files as context."""
+    files = {}
+    for path, head_source in head.items():
+        head_lines = head_source.splitlines()
+        base_lines = base.get(path, "").splitlines() if path in base else []
+        changed: Set[int] = set()
+        matcher = difflib.SequenceMatcher(None, base_lines, head_lines, autojunk=False)
+        for tag, _, _, j1, j2 in matcher.get_opcodes():
+            if tag in ("replace", "insert"):
+                changed.update(range(j1 + 1, j2 + 1))
+            elif tag == "delete" and head_lines:
+                changed.add(min(j1 + 1, len(head_lines)))
+        if changed:
+            files[path] = {
+                "lines": {i: text for i, text in enumerate(head_lines, 1)},
+                "changed": changed,
+                "header": source_header(head_source, detect_language(path)),
+                "total_lines": len(head_lines),
+            }
+    return files
+
+def build_segments(change: Dict[str, Any], context_lines: int = DIFF_CONTEXT_LINES,
+                   max_chars: int = DIFF_SEGMENT_CHARS) -> List[Dict[str, Any]]:
+    """
+    Turn one file's changes into review segments: each changed line plus context_lines around it,
+    merged into contiguous runs of known head lines. Segments use the chunk format
+    ({"start_line", "end_line", "text", "header", "changed"}) so llm_agent can review and remap them.
+    """
+    known = change["lines"]
+    wanted = set()
+    for line in change["changed"]:
+        wanted.update(l for l in range(line - context_lines, line + context_lines + 1) if l in known)
+
+    segments = []
+    run: List[int] = []
+    size = 0
+    for line in sorted(wanted):
+        text_len = len(known[line]) + 1
+        if run and (line != run[-1] + 1 or size + text_len > max_chars):
+            segments.append(_segment(run, change))
+            run, size = [], 0
+        run.append(line)
+        size += text_len
+    if run:
+        segments.append(_segment(run, change))
+    return [s for s in segments if s["changed"]]
+
+def _segment(run: List[int], change: Dict[str, Any]) -> Dict[str, Any]:
+    lines = change["lines"]
+    return {
+        "start_line": run[0],
+        "end_line": run[-1],
+        "text": "\n".join(lines[l] for l in run) + "\n",
+        "header": change["header"],
+        "changed": sorted(l for l in run if l in change["changed"]),
+    }
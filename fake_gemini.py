@@ -0,0 +1,245 @@
+"""
+Local stand-in for the Gemini generateContent / streamGenerateContent endpoints (benchmarks, load tests).
+
+Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:<port> (any GEMINI_API_KEY works).
+Replies are built from the prompt: one finding per suspicious line (eval, password, strcpy, ...),
+keyed per file for batch prompts. Faults are injected at configurable rates.
+POST /v1beta/cachedContents is supported, so requests may reference a cachedContent handle.
+
+Usage: python fake_gemini.py [--port 8765] [--latency-ms 800] [--latency-sigma 0.5]
+                             [--rate-429 0.0] [--rate-500 0.0] [--malformed 0.0] [--truncated 0.0] [--seed 0]
+GET /stats returns request and fault counters.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, List, Tuple
+
+SUSPICIOUS = re.compile(r"\beval\s*\(|password|secret|token|strcpy|gets\s*\(|innerHTML|exec\s*\(|==\s*\"", re.IGNORECASE)
+
+class FakeGeminiConfig:
+    def __init__(self, latency_ms: float = 800.0, latency_sigma: float = 0.5, rate_429: float = 0.0,
+                 malformed: float = 0.0, truncated: float = 0.0, seed: Optional[int] = None, rate_500: float = 0.0):
+        self.latency_ms = latency_ms # Median of a log-normal latency distribution
+        self.latency_sigma = latency_sigma
+        self.rate_429 = rate_429
+        self.malformed = malformed
+        self.truncated = truncated
+        self.rate_500 = rate_500 # Outage simulation (circuit breaker)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "server_error": 0, "malformed": 0, "truncated": 0, "cache_created": 0, "cache_used": 0}
+        self.cached_contents: Dict[str, Tuple[str, float]] = {} # name -> (system instruction, expires at)
+        self.cache_min_tokens = 0
+        self.models: Dict[str, int] = {} # Requests per model (tiering)
+
+    def create_cache(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """cachedContents.create: None if the instruction is under cache_min_tokens (as the real API rejects it)."""
+        parts = body.get("systemInstruction", {}).get("parts", [])
+        text = "".join(p.get("text", "") for p in parts)
+        if len(text) // 4 < self.cache_min_tokens:
+            return None
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        with self.lock:
+            name = f"cachedContents/fake{len(self.cached_contents) + 1}"
+            self.cached_contents[name] = (text, time.time() + ttl)
+            self.stats["cache_created"] += 1
+        return {"name": name, "model": body.get("model"), "usageMetadata": {"totalTokenCount": len(text) // 4}}
+
+    def cached_instruction(self, name: str) -> Optional[str]:
+        with self.lock:
+            entry = self.cached_contents.get(name)
+            if entry is None or entry[1] < time.time():
+                return None
+            self.stats["cache_used"] += 1
+            return entry[0]
+
+    def draw(self):
+        """(latency seconds, fault) for one request; fault is None, "429", "500", "malformed" or "truncated"."""
+        with self.lock:
+            self.stats["requests"] += 1
+            latency = self.random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000 if self.latency_ms > 0 else 0.0
+            roll = self.random.random()
+            fault = None
+            if roll < self.rate_500:
+                fault = "500"
+                self.stats["server_error"] += 1
+            elif roll < self.rate_500 + self.rate_429:
+                fault = "429"
+                self.stats["rate_limited"] += 1
+            elif roll < self.rate_500 + self.rate_429 + self.malformed:
+                fault = "malformed"
+                self.stats["malformed"] += 1
+            elif roll < self.rate_500 + self.rate_429 + self.malformed + self.truncated:
+                fault = "truncated"
+                self.stats["truncated"] += 1
+            else:
+                self.stats["ok"] += 1
+        return latency, fault
+
+def fake_review(code: str) -> Dict[str, Any]:
+    findings = []
+    for lineno, line in enumerate(code.splitlines(), 1):
+        if SUSPICIOUS.search(line):
+            findings.append({
+                "id": f"F{len(findings) + 1:03d}",
+                "title": "Suspicious construct",
+                "description": f"Line looks risky: {line.strip()[:80]}",
+                "severity": "high",
+                "line": lineno,
+                "recommendation": "Review this line.",
+                "category": "security",
+            })
+    score = max(10.0 - 1.5 * len(findings), 1.0)
+    return {
+        "summary_markdown": f"## Summary\n\nFake review: {len(findings)} suspicious line(s).",
+        "findings": findings,
+        "rating": {"quality": score, "security": score, "maintainability": 8.0, "overall": round((score * 2 + 8.0) / 3, 1)},
+    }
+
+def file_blocks(prompt: str) -> List[Tuple[str, str]]:
+    """(file name, code) for each "File: ... Code: ```...```" block in a prompt."""
+    blocks = []
+    for part in prompt.split("\nFile: ")[1:]:
+        name = part.split("\n", 1)[0].strip()
+        start = part.find("\nCode:\n```")
+        if start < 0:
+            continue
+        body = part[start + len("\nCode:\n```"):].split("\n", 1)[-1]
+        end = body.rfind("\n```")
+        blocks.append((name, body[:end] if end >= 0 else body))
+    return blocks
+
+def fake_reply(prompt: str) -> str:
+    """Review JSON for a single-file or batch prompt."""
+    blocks = file_blocks(prompt)
+    if prompt.startswith("You are a senior code reviewer.") and blocks:
+        return json.dumps({name: fake_review(code) for name, code in blocks})
+    return json.dumps(fake_review(blocks[0][1] if blocks else ""))
+
+def make_handler(config: FakeGeminiConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/stats"):
+                with config.lock:
+                    self._send(200, json.dumps({**config.stats, "models": config.models}).encode())
+            else:
+                self._send(404, b'{"error": "not found"}')
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.startswith("/v1beta/cachedContents"):
+                created = config.create_cache(json.loads(body))
+                if created is None:
+                    self._send(400, b'{"error": {"code": 400, "message": "Cached content is too small"}}')
+                else:
+                    self._send(200, json.dumps(created).encode())
+                return
+            latency, fault = config.draw()
+            if ":generateContent" not in self.path and ":streamGenerateContent" not in self.path:
+                self._send(404, b'{"error": {"code": 404, "message": "unknown method"}}')
+                return
+            model = self.path.split("/models/", 1)[-1].split(":", 1)[0]
+            with config.lock:
+                config.models[model] = config.models.get(model, 0) + 1
+            if fault == "429":
+                time.sleep(latency)
+                self._send(429, b'{"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}')
+                return
+            if fault == "500":
+                time.sleep(latency)
+                self._send(500, b'{"error": {"code": 500, "status": "INTERNAL"}}')
+                return
+
+            try:
+                request = json.loads(body)
+                prompt = request["contents"][0]["parts"][0]["text"]
+            except (ValueError, KeyError, IndexError):
+                self._send(400, b'{"error": {"code": 400, "message": "bad request"}}')
+                return
+            instruction, cached_tokens = "".join(p.get("text", "") for p in request.get("systemInstruction", {}).get("parts", [])), 0
+            if request.get("cachedContent"):
+                instruction = config.cached_instruction(request["cachedContent"])
+                if instruction is None:
+                    self._send(404, b'{"error": {"code": 404, "message": "CachedContent not found"}}')
+                    return
+                cached_tokens = len(instruction) // 4
+            # Caching mainly cuts time to first token: scale the simulated latency by the uncached share
+            prompt_tokens = (len(instruction) + len(prompt)) // 4
+            time.sleep(latency * (prompt_tokens - cached_tokens) / max(prompt_tokens, 1))
+            text = fake_reply(prompt)
+            if fault == "malformed":
+                text = "Here is the review you asked for:\n" + text.replace('",', '" ,,', 3).replace('"', "'", 6)
+            elif fault == "truncated":
+                text = text[:max(len(text) * 2 // 3, 1)]
+
+            usage = {"promptTokenCount": prompt_tokens, "cachedContentTokenCount": cached_tokens, "candidatesTokenCount": len(text) // 4}
+            if ":streamGenerateContent" in self.path:
+                self._stream(text, usage)
+            else:
+                payload = {
+                    "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "MAX_TOKENS" if fault == "truncated" else "STOP"}],
+                    "usageMetadata": usage,
+                }
+                self._send(200, json.dumps(payload).encode())
+
+        def _stream(self, text: str, usage: Dict[str, int]):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for i in range(0, len(text), 200):
+                chunk = {"candidates": [{"content": {"parts": [{"text": text[i:i + 200]}]}}]}
+                if i + 200 >= len(text):
+                    chunk["usageMetadata"] = usage # Gemini sends the final counts with the last chunk
+                piece = json.dumps(chunk)
+                self.wfile.write(f"data: {piece}\r\n\r\n".encode())
+                self.wfile.flush()
+
+        def _send(self, status: int, data: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def start_fake_gemini(config: FakeGeminiConfig, host: str = "127.0.0.1", port: int = 0):
+    """Serve in a daemon thread. Returns (server, base_url); stop with server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Median latency (log-normal)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal sigma; 0 = constant latency")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Fraction of replies with broken JSON")
+    parser.add_argument("--truncated", type=float, default=0.0, help="Fraction of replies cut off mid-JSON")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cache-min-tokens", type=int, default=0, help="Reject cachedContents smaller than this (real API: ~1024+)")
+    args = parser.parse_args()
+    config = FakeGeminiConfig(args.latency_ms, args.latency_sigma, args.rate_429, args.malformed, args.truncated, args.seed, args.rate_500)
+    config.cache_min_tokens = args.cache_min_tokens
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Fake Gemini on http://{args.host}:{args.port} (set GEMINI_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
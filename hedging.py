@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, Deque, Optional, TypeVar
+from utils import get_logger, env_flag
+from metrics import METRICS
+
+logger = get_logger("Hedging")
+
+# Configuration
+GEMINI_HEDGE = env_flag("GEMINI_HEDGE", False)
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")) # Hedge once a call is slower than this
+GEMINI_HEDGE_BUDGET = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.05")) # Extra calls as a fraction of all calls
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20")) # No hedging until this many latencies
+GEMINI_HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "2.0")) # Seconds; never hedge sooner
+WINDOW = 200 # Recent latencies kept per key
+
+T = TypeVar("T")
+
+class Hedger:
+    """
+    Tail-latency hedging: if a call hasn't finished after the GEMINI_HEDGE_PERCENTILE of recent latencies,
+    start an identical second call, return whichever finishes first and cancel the other.
+    Hedges are capped at budget x primary calls so a slow period can't double the request rate,
+    and only go out when admit() (e.g. a free rate-limiter token) allows them.
+    """
+
+    def __init__(self, percentile: float, budget: float, min_samples: int, min_delay: float, enabled: bool = True):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.stats = {"calls": 0, "hedged": 0, "hedge_won": 0, "budget_exhausted": 0, "not_admitted": 0}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]],
+                  admit: Optional[Callable[[], Awaitable[bool]]] = None,
+                  ok: Callable[[T], bool] = lambda result: True) -> T:
+        """
+        await call(), hedged per key (e.g. the model). Exceptions come from the winning attempt.
+        admit() is awaited before a hedge is sent; False skips it. Only results passing ok()
+        feed the latency window, so fast error replies don't pull the hedge delay down.
+        """
+        if not self.enabled:
+            return await call()
+        with self._lock:
+            self.stats["calls"] += 1
+        delay = self.delay(key)
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(call())
+        tasks = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._take_budget():
+                    if admit is None or await admit():
+                        logger.info(f"Hedging {key}: no reply after {delay:.1f}s")
+                        tasks.append(asyncio.ensure_future(call()))
+                    else:
+                        self._refund()
+            winner = await self._first_success(tasks)
+            if winner is not primary:
+                with self._lock:
+                    self.stats["hedge_won"] += 1
+                METRICS.inc("gemini_hedges_total", outcome="won")
+            elif len(tasks) > 1:
+                METRICS.inc("gemini_hedges_total", outcome="lost")
+            if winner.exception() is None and ok(winner.result()):
+                self._record(key, time.perf_counter() - started)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel() # Loser (or both, if our caller was cancelled)
+
+    def delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging a call on key, or None while there are too few samples."""
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        idx = min(int(len(samples) * self.percentile / 100), len(samples) - 1)
+        return max(samples[idx], self.min_delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            keys = list(self._latencies)
+        stats["hedge_ratio"] = round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0
+        delays = {k: self.delay(k) for k in keys}
+        stats["delays"] = {k: round(d, 3) for k, d in delays.items() if d is not None}
+        stats["enabled"] = self.enabled
+        return stats
+
+    async def _first_success(self, tasks: list) -> asyncio.Future:
+        """The first task to finish without raising; if all raise, the last one to finish."""
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None or not pending:
+                    return task
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.stats["hedged"] + 1 > self.budget * self.stats["calls"]:
+                self.stats["budget_exhausted"] += 1
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    def _refund(self):
+        with self._lock:
+            self.stats["hedged"] -= 1
+            self.stats["not_admitted"] += 1
+
+    def _record(self, key: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=WINDOW)).append(seconds)
+
+GEMINI_HEDGER = Hedger(GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_BUDGET, GEMINI_HEDGE_MIN_SAMPLES, GEMINI_HEDGE_MIN_DELAY, GEMINI_HEDGE)
@@ -0,0 +1,150 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+from utils import get_logger, generate_report_id
+
+logger = get_logger("Jobs")
+
+# Configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "500")) # Finished jobs kept for polling
+
+ProgressCallback = Callable[[int, int], None]
+JobRunner = Callable[[ProgressCallback], Awaitable[Dict[str, Any]]]
+
+class QueueFullError(Exception):
+    """The job queue is at JOB_MAX_QUEUED."""
+
+class JobQueue:
+    """
+    In-process review job queue.
+    submit() returns immediately; a fixed pool of asyncio worker tasks runs jobs in FIFO order.
+    Workers are started lazily on first submit (inside the running event loop).
+    """
+
+    def __init__(self, workers: int, max_queued: int, retention: int):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._runners: Dict[str, JobRunner] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._started_at: Optional[float] = None
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def submit(self, kind: str, runner: JobRunner, total: int = 1) -> Dict[str, Any]:
+        """Queue a job. runner(progress) does the work and returns the result payload."""
+        self._ensure_workers()
+        if self._queue.qsize() >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"Job queue full ({self.max_queued} waiting)")
+
+        job_id = generate_report_id()
+        while job_id in self._jobs:
+            job_id = generate_report_id()
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "progress": {"done": 0, "total": total},
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None,
+        }
+        self._jobs[job_id] = job
+        self._runners[job_id] = runner
+        self._queue.put_nowait(job_id)
+        self.stats["submitted"] += 1
+        logger.info(f"Queued job {job_id} ({kind}), depth {self._queue.qsize()}")
+        return self.view(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return self.view(job) if job else None
+
+    def view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Public (JSON-safe) snapshot of a job."""
+        data = {k: v for k, v in job.items() if k not in ("created", "started", "finished")}
+        now = time.time()
+        if job["started"]:
+            data["queued_seconds"] = round(job["started"] - job["created"], 2)
+            data["run_seconds"] = round((job["finished"] or now) - job["started"], 2)
+        else:
+            data["queued_seconds"] = round(now - job["created"], 2)
+        return data
+
+    def get_stats(self) -> Dict[str, Any]:
+        uptime = time.time() - self._started_at if self._started_at else 0.0
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "utilisation": round(self._busy_seconds / (uptime * self.workers), 3) if uptime else 0.0,
+            "tracked_jobs": len(self._jobs),
+        }
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    # --- Internals ---
+
+    def _ensure_workers(self):
+        if self._tasks and not any(t.done() for t in self._tasks):
+            return
+        self._queue = asyncio.Queue()
+        self._started_at = time.time()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            runner = self._runners.pop(job_id, None)
+            if job is None or runner is None:
+                continue
+
+            def progress(done: int, total: int, job=job):
+                job["progress"] = {"done": done, "total": total}
+
+            job["status"] = "running"
+            job["started"] = time.time()
+            self._busy += 1
+            try:
+                job["result"] = await runner(progress)
+                job["status"] = "done"
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                job["status"] = "failed"
+                job["error"] = "Cancelled"
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                job["status"] = "failed"
+                job["error"] = getattr(e, "detail", None) or str(e)
+                self.stats["failed"] += 1
+            finally:
+                job["finished"] = time.time()
+                self._busy -= 1
+                self._busy_seconds += job["finished"] - job["started"]
+                self._prune()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond JOB_RETENTION."""
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in ("done", "failed")]
+        for jid in finished[:max(len(finished) - self.retention, 0)]:
+            del self._jobs[jid]
+
+JOB_QUEUE = JobQueue(JOB_WORKERS, JOB_MAX_QUEUED, JOB_RETENTION)
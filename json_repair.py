@@ -0,0 +1,219 @@
+import re
+import json
+from typing import Dict, Any, List, Tuple
+from utils import get_logger, StatsCounter, RATING_KEYS
+from metrics import METRICS
+
+logger = get_logger("JsonRepair")
+
+class JsonRepairError(ValueError):
+    """Nothing usable could be recovered from the model output."""
+
+REPAIR_STATS = StatsCounter("responses", "clean", "repaired", "failed", "findings_salvaged")
+REPAIR_KINDS = StatsCounter() # Repair name -> responses it was applied to
+
+OBJECT_START = re.compile(r"\{\s*[\"'}]") # A brace that can open a JSON object (not "{the}" in prose)
+STRICT = json.JSONDecoder()
+LENIENT = json.JSONDecoder(strict=False) # Accepts raw newlines / tabs inside strings
+
+def parse_model_json(text: str) -> Tuple[Any, List[str]]:
+    """
+    json.loads with repairs for common LLM output damage.
+    Returns (value, repairs applied). Raises JsonRepairError if nothing parses.
+    Repairs: raw control characters inside strings, markdown fences / prose around
+    the object, single-quoted strings, trailing or doubled commas, and truncation
+    (cut back to the last complete element, drop a half-written array element such
+    as a finding, then close open brackets).
+    """
+    text = _strip_fences(text)
+    try:
+        value, end, repairs = _decode(text, 0)
+        if not text[end:].strip():
+            return value, repairs
+    except ValueError:
+        pass
+
+    # Prose can hold braces of its own: try each place an object could start, first as-is, then repaired
+    starts = [m.start() for m in OBJECT_START.finditer(text)]
+    if not starts:
+        raise JsonRepairError("No JSON object in response")
+    error = None
+    for start in starts:
+        try:
+            value, end, more = _decode(text, start)
+            return value, sorted(set(more + ["surrounding_text"]))
+        except ValueError:
+            pass
+        # Keep everything after the opening brace: a truncated reply has no closing one
+        repairs = ["surrounding_text"] if start > 0 else []
+        fixed, more = _normalize(text[start:])
+        try:
+            value, _, lenient = _decode(fixed, 0)
+            return value, sorted(set(repairs + more + lenient))
+        except ValueError as e:
+            error = e
+    raise JsonRepairError(f"Unrepairable JSON: {error}")
+
+def parse_review_json(text: str) -> Dict[str, Any]:
+    """parse_model_json for a single review: fills missing keys and drops malformed findings. Records stats."""
+    try:
+        data, repairs = parse_model_json(text)
+        review = salvage_review(data)
+    except JsonRepairError:
+        REPAIR_STATS.inc(responses=1, failed=1)
+        METRICS.inc("gemini_json_repairs_total", outcome="failed")
+        raise
+    if repairs:
+        REPAIR_STATS.inc(responses=1, repaired=1, findings_salvaged=len(review["findings"]))
+        REPAIR_KINDS.inc(**{kind: 1 for kind in repairs})
+        METRICS.inc("gemini_json_repairs_total", outcome="repaired")
+        stats = REPAIR_STATS.get_stats()
+        logger.warning(f"Repaired model JSON ({', '.join(repairs)}), kept {len(review['findings'])} findings; "
+                       f"{stats['repaired']} repaired / {stats['failed']} failed of {stats['responses']} responses")
+    else:
+        REPAIR_STATS.inc(responses=1, clean=1)
+    return review
+
+def salvage_review(data: Any) -> Dict[str, Any]:
+    """Coerce parsed JSON into the review schema, keeping every usable finding."""
+    if not isinstance(data, dict):
+        raise JsonRepairError("Response is not a JSON object")
+    findings = [f for f in data.get("findings", []) if isinstance(f, dict) and (f.get("title") or f.get("description"))] \
+        if isinstance(data.get("findings"), list) else []
+    if not findings and not isinstance(data.get("summary_markdown"), str):
+        raise JsonRepairError("No summary or findings in response")
+
+    for f in findings:
+        f.setdefault("title", "Untitled finding")
+        f.setdefault("description", "")
+        f.setdefault("severity", "info")
+        f.setdefault("line", 0)
+        f.setdefault("recommendation", "")
+        f.setdefault("category", "general")
+    rating = data.get("rating") if isinstance(data.get("rating"), dict) else {}
+    return {
+        **data,
+        "summary_markdown": data.get("summary_markdown") if isinstance(data.get("summary_markdown"), str)
+            else "## Summary\n\n_The model's summary was lost (incomplete response); findings below were recovered._",
+        "findings": findings,
+        "rating": {k: rating.get(k, 0.0) for k in RATING_KEYS} if rating else {k: 0.0 for k in RATING_KEYS},
+    }
+
+def _decode(text: str, start: int) -> Tuple[Any, int, List[str]]:
+    """The JSON value at text[start] with its end index; raw control characters count as a repair."""
+    try:
+        value, end = STRICT.raw_decode(text, start)
+        return value, end, []
+    except ValueError:
+        value, end = LENIENT.raw_decode(text, start)
+        return value, end, ["control_characters"]
+
+def _normalize(body: str) -> Tuple[str, List[str]]:
+    """Single pass over JSON-ish text: requote strings, drop stray commas, close what was left open."""
+    out: List[str] = []
+    stack: List[str] = [] # Open containers: "{" or "["
+    opens: List[int] = [] # Output length before each open container's bracket
+    repairs = set()
+    safe_len, safe_stack, safe_opens = 0, [], [] # Output length / open stack after the last complete element
+    i, n = 0, len(body)
+    while i < n:
+        ch = body[i]
+        if ch in "\"'":
+            value, i, closed = _read_string(body, i)
+            if ch == "'":
+                repairs.add("single_quotes")
+            if not closed:
+                repairs.add("truncated")
+                break
+            out.append(value)
+            continue
+        if ch in "{[":
+            stack.append(ch)
+            opens.append(len(out))
+            out.append(ch)
+        elif ch in "}]":
+            if _last_token(out) == ",":
+                _drop_last_comma(out)
+                repairs.add("trailing_commas")
+            if stack:
+                stack.pop()
+                opens.pop()
+            out.append(ch)
+            safe_len, safe_stack, safe_opens = len(out), list(stack), list(opens)
+            if not stack:
+                if body[i + 1:].strip():
+                    repairs.add("surrounding_text")
+                break
+        elif ch == ",":
+            if _last_token(out) in (",", "{", "["):
+                repairs.add("trailing_commas") # Doubled or leading comma
+            else:
+                out.append(ch)
+                safe_len, safe_stack, safe_opens = len(out) - 1, list(stack), list(opens) # Everything before a comma is complete
+        else:
+            out.append(ch)
+        i += 1
+
+    if stack:
+        # Truncated: cut back to the last complete element and close the containers open at that point
+        repairs.add("truncated")
+        out, stack = out[:safe_len], safe_stack
+        # An object still open inside an array (e.g. a finding) is missing fields: drop it rather than close it
+        for depth in range(len(stack) - 1, 0, -1):
+            if stack[depth] == "{" and stack[depth - 1] == "[":
+                out, stack = out[:safe_opens[depth]], stack[:depth]
+                break
+        if _last_token(out) == ",":
+            _drop_last_comma(out)
+        out.extend("}" if c == "{" else "]" for c in reversed(stack))
+    return "".join(out), sorted(repairs)
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text.startswith("json"):
+            text = text[4:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+def _read_string(body: str, i: int) -> Tuple[str, int, bool]:
+    """Read a '...' or "..." string at body[i]; returns (JSON double-quoted string, next index, closed)."""
+    quote = body[i]
+    chars = ['"']
+    i += 1
+    while i < len(body):
+        ch = body[i]
+        if ch == "\\" and i + 1 < len(body):
+            nxt = body[i + 1]
+            chars.append(nxt if (quote == "'" and nxt == "'") else ch + nxt)
+            i += 2
+            continue
+        if ch == quote and (quote == '"' or _ends_single_quoted(body, i + 1)):
+            chars.append('"')
+            return "".join(chars), i + 1, True
+        if ch == '"':
+            chars.append('\\"') # Only reachable inside a single-quoted string
+        else:
+            chars.append(ch)
+        i += 1
+    return "".join(chars), i, False
+
+def _ends_single_quoted(body: str, i: int) -> bool:
+    """A ' closes a single-quoted string only before : , } ] (otherwise it's an apostrophe, as in "it's")."""
+    rest = body[i:].lstrip()
+    return not rest or rest[0] in ":,}]"
+
+def _last_token(out: List[str]) -> str:
+    for piece in reversed(out):
+        if piece.strip():
+            return piece.strip()[-1]
+    return ""
+
+def _drop_last_comma(out: List[str]):
+    for idx in range(len(out) - 1, -1, -1):
+        if out[idx].strip():
+            if out[idx].strip() == ",":
+                del out[idx]
+            return
@@ -1,12 +1,27 @@
 
 import os
-import time
 import json
 import re
-import requests
-from typing import Dict, Any, Optional
+import time
+import asyncio
+import logging
+import weakref
+import httpx
+from typing import Dict, Any, List, Optional, AsyncIterator, Callable
 from dotenv import load_dotenv
-from utils import get_logger
+from utils import get_logger, env_flag, as_int, as_float
+from review_cache import REVIEW_CACHE, SINGLE_FLIGHT, make_cache_key, sha256_text
+from rate_limiter import GEMINI_RATE_LIMITER, estimate_tokens
+from chunker import split_source, split_units, pack_units, merge_chunk_reviews
+from stream_parser import FindingStreamParser
+from metrics import METRICS
+from context_cache import CONTEXT_CACHE
+from json_repair import JsonRepairError, parse_model_json, parse_review_json
+from triage import TRIAGE_ENABLED, triage_source, build_local_result, merge_local_findings, describe_findings
+from model_router import ModelRouter
+from hedging import GEMINI_HEDGER
+from circuit_breaker import GEMINI_CIRCUIT
+from compactor import PROMPT_COMPACTION, compact_source, compacted_line, remap_line, remap_findings, output_token_budget
 
 load_dotenv(override=True)
 logger = get_logger("LLMAgent")
@@ -15,130 +30,940 @@ logger = get_logger("LLMAgent")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
+# Model tiering: small files -> GEMINI_FAST_MODEL, large or security-sensitive ones -> GEMINI_STRONG_MODEL.
+# Both default to GEMINI_MODEL, so routing changes nothing until a tier model is set.
+MODEL_ROUTER = ModelRouter(
+    GEMINI_MODEL,
+    fast_model=os.getenv("GEMINI_FAST_MODEL", "").strip() or GEMINI_MODEL,
+    strong_model=os.getenv("GEMINI_STRONG_MODEL", "").strip() or GEMINI_MODEL,
+    fast_max_lines=int(os.getenv("GEMINI_FAST_MAX_LINES", "150")),
+    strong_min_lines=int(os.getenv("GEMINI_STRONG_MIN_LINES", "1500")),
+    risk_routing=env_flag("GEMINI_RISK_ROUTING", True),
+)
+
 # Debug Logging for Render
 if len(GEMINI_API_KEY) > 5:
     logger.info(f"Loaded API Key: {GEMINI_API_KEY[:5]}... (Length: {len(GEMINI_API_KEY)})")
     logger.info(f"Loaded Model: {GEMINI_MODEL}")
+    if len(set(MODEL_ROUTER.models.values())) > 1:
+        logger.info(f"Model tiers: {MODEL_ROUTER.models}")
 else:
     logger.error(f"CRITICAL: API Key is missing or too short! Value: '{GEMINI_API_KEY}'")
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={key}"
+# Point at a stand-in (e.g. fake_gemini.py for benchmarks) without touching the paths
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+API_URL_TEMPLATE = GEMINI_BASE_URL + "/v1beta/models/{model}:generateContent?key={key}"
+STREAM_URL_TEMPLATE = GEMINI_BASE_URL + "/v1beta/models/{model}:streamGenerateContent?alt=sse&key={key}"
 
-# Strict JSON Schema Prompt
-REVIEW_PROMPT_TEMPLATE = """You are a senior {language} code reviewer.
-Analyze the following code.
+# Strict JSON Schema Prompt, split so the fixed part can be cached by Gemini:
+# SYSTEM_INSTRUCTION is identical for every file (sent as systemInstruction or via cachedContents),
+# REVIEW_PROMPT_TEMPLATE is the per-file suffix.
+SYSTEM_INSTRUCTION = """You are a senior code reviewer.
+Analyze the code in each request.
 
 OUTPUT FORMAT:
 Return a SINGLE valid JSON object. Do not add markdown backticks or extra text.
 The JSON must strictly follow this schema:
 
-{{
+{
   "summary_markdown": "## Summary\\n\\n(A concise summary of the code and issues found)...",
   "findings": [
-    {{
+    {
       "id": "F001",
       "title": "Short title",
       "description": "Detailed description",
-      "severity": "high", 
+      "severity": "high",
       "line": 10,
       "recommendation": "Fix recommendation",
       "category": "security"
-    }}
+    }
   ],
-  "rating": {{
+  "rating": {
     "quality": 7.5,
     "security": 6.0,
     "maintainability": 8.0,
     "overall": 7.2
-  }}
-}}
+  }
+}
 
 RULES:
 1. "severity" must be: critical, high, medium, low, or info.
 2. "category" examples: security, robustness, style, performance.
 3. If code is empty or trivial, return a valid JSON with empty findings.
+"""
+
+REVIEW_PROMPT_TEMPLATE = """Review this {language} code.
 
 Context:
 File: {filename}
 Language: {language}
+{context}
+Code:
+```{language}
+{source_code}
+```
+"""
+
+# Extra context for one chunk of a large file (fills {context} above)
+CHUNK_CONTEXT_TEMPLATE = """Part {part} of {parts}: original lines {start_line}-{end_line}.
+Report "line" relative to the first line of the Code block below (line 1 = first line shown).
+"""
+CHUNK_HEADER_TEMPLATE = """Declarations from the rest of the file, for reference only (do not review them):
+```{language}
+{header}
+```
+"""
 
+# Extra context for a pull-request excerpt (appended to CHUNK_CONTEXT_TEMPLATE)
+DIFF_CONTEXT_TEMPLATE = """This excerpt surrounds lines changed in a pull request.
+Changed lines (numbered from the first line of the Code block): {changed}.
+Only report issues on or caused by the changed lines; the other lines are context.
+"""
+
+# Several small files in one request (batch mode); each file is one BATCH_FILE_TEMPLATE block
+BATCH_PROMPT_TEMPLATE = """You are a senior code reviewer.
+Analyze each of the {count} files below independently.
+
+OUTPUT FORMAT:
+Return a SINGLE valid JSON object. Do not add markdown backticks or extra text.
+Its keys are the file names exactly as given after "File:"; each value is that file's review
+and must strictly follow this schema:
+
+{{
+  "example.py": {{
+    "summary_markdown": "## Summary\\n\\n(A concise summary of the code and issues found)...",
+    "findings": [
+      {{
+        "id": "F001",
+        "title": "Short title",
+        "description": "Detailed description",
+        "severity": "high",
+        "line": 10,
+        "recommendation": "Fix recommendation",
+        "category": "security"
+      }}
+    ],
+    "rating": {{
+      "quality": 7.5,
+      "security": 6.0,
+      "maintainability": 8.0,
+      "overall": 7.2
+    }}
+  }}
+}}
+
+RULES:
+1. "severity" must be: critical, high, medium, low, or info.
+2. "category" examples: security, robustness, style, performance.
+3. "line" counts from the first line of that file's Code block.
+4. Every file must have an entry, even if it has no findings.
+
+{files}"""
+BATCH_FILE_TEMPLATE = """File: {filename}
+Language: {language}
+{context}
 Code:
 ```{language}
 {source_code}
 ```
+
 """
 
-def clean_json_response(text: str) -> str:
-    """Remove markdown backticks if present."""
-    text = text.strip()
-    if text.startswith("```json"):
-        text = text[7:]
-    if text.startswith("```"):
-        text = text[3:]
-    if text.endswith("```"):
-        text = text[:-3]
-    return text.strip()
+# Findings from the local static pass (triage.py); the model should spend its effort elsewhere
+TRIAGE_CONTEXT_TEMPLATE = """Static checks already reported these; do not repeat them:
+{notes}
+"""
 
-def generate_llm_review(source_code: str, filename: str, language: str) -> Dict[str, Any]:
+# HTTP Client Pool (per worker)
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "20"))
+GEMINI_KEEPALIVE_CONNECTIONS = int(os.getenv("GEMINI_KEEPALIVE_CONNECTIONS", "10"))
+GEMINI_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "10"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "60")) # High timeout for large files
+GEMINI_HTTP2 = env_flag("GEMINI_HTTP2", False)
+
+if GEMINI_HTTP2:
+    try:
+        import h2  # noqa: F401  (httpx needs it for http2=True)
+    except ImportError:
+        logger.warning("GEMINI_HTTP2 is set but the 'h2' package is not installed. Falling back to HTTP/1.1")
+        GEMINI_HTTP2 = False
+
+# The request URL carries the API key; keep httpx's per-request INFO lines out of the logs
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Pooled async client, one per event loop (scripts using asyncio.run get a fresh loop each call)
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+_ASYNC_CLIENT_LOOP = None
+
+# Pool counters (cumulative across client re-creations)
+_POOL_COUNTERS = {"requests": 0, "connections_opened": 0}
+_SEEN_CONNECTIONS = weakref.WeakSet()
+
+def _get_pool(client: httpx.AsyncClient):
+    """Return the underlying httpcore pool, or None if the transport isn't the default one."""
+    transport = getattr(client, "_transport", None)
+    return getattr(transport, "_pool", None)
+
+async def _track_pool_response(response: httpx.Response):
+    """Response hook: count requests and newly opened connections."""
+    _POOL_COUNTERS["requests"] += 1
+    pool = _get_pool(_ASYNC_CLIENT) if _ASYNC_CLIENT is not None else None
+    if pool is None:
+        return
+    for conn in pool.connections:
+        if conn not in _SEEN_CONNECTIONS:
+            _SEEN_CONNECTIONS.add(conn)
+            _POOL_COUNTERS["connections_opened"] += 1
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient for the running event loop."""
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT_LOOP is not loop or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            http2=GEMINI_HTTP2,
+            timeout=httpx.Timeout(
+                connect=GEMINI_CONNECT_TIMEOUT,
+                read=GEMINI_READ_TIMEOUT,
+                write=GEMINI_CONNECT_TIMEOUT,
+                pool=GEMINI_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=GEMINI_POOL_SIZE,
+                max_keepalive_connections=GEMINI_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"response": [_track_pool_response]},
+        )
+        _ASYNC_CLIENT_LOOP = loop
+    return _ASYNC_CLIENT
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Snapshot of the Gemini connection pool for sizing GEMINI_POOL_SIZE per worker."""
+    active = idle = 0
+    pool = _get_pool(_ASYNC_CLIENT) if _ASYNC_CLIENT is not None and not _ASYNC_CLIENT.is_closed else None
+    if pool is not None:
+        for conn in pool.connections:
+            if conn.is_idle():
+                idle += 1
+            elif not conn.is_closed():
+                active += 1
+    requests_sent = _POOL_COUNTERS["requests"]
+    opened = _POOL_COUNTERS["connections_opened"]
+    return {
+        "pool_size": GEMINI_POOL_SIZE,
+        "keepalive_connections": GEMINI_KEEPALIVE_CONNECTIONS,
+        "http2": GEMINI_HTTP2,
+        "active_connections": active,
+        "idle_connections": idle,
+        "requests": requests_sent,
+        "connections_opened": opened,
+        "handshakes_avoided": max(requests_sent - opened, 0),
+    }
+
+async def close_async_client():
+    """Close the shared AsyncClient (call on app shutdown)."""
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP
+    if _ASYNC_CLIENT is not None and not _ASYNC_CLIENT.is_closed:
+        await _ASYNC_CLIENT.aclose()
+    _ASYNC_CLIENT = None
+    _ASYNC_CLIENT_LOOP = None
+
+class CachedContentError(Exception):
+    """Gemini refused the cachedContent handle (expired or deleted server-side)."""
+
+class ReviewError(Exception):
+    """Gemini could not produce a usable review; the message becomes the fallback reason."""
+
+MAX_SOURCE_CHARS = 30000 # Safe chars limit; larger files are chunked
+CHUNK_CHARS = int(os.getenv("GEMINI_CHUNK_CHARS", "20000"))
+CHUNK_MAX_CONCURRENCY = int(os.getenv("GEMINI_CHUNK_CONCURRENCY", "4"))
+INCREMENTAL_REVIEW = env_flag("INCREMENTAL_REVIEW", True)
+
+# Batch mode: small files share one request (helps when RPM, not TPM, is the limit)
+GEMINI_BATCH_MODE = env_flag("GEMINI_BATCH_MODE", False)
+BATCH_MAX_TOKENS = int(os.getenv("GEMINI_BATCH_MAX_TOKENS", "8000")) # Estimated source tokens per request
+BATCH_FILE_MAX_TOKENS = int(os.getenv("GEMINI_BATCH_FILE_MAX_TOKENS", "2000")) # Larger files go alone
+BATCH_MAX_FILES = int(os.getenv("GEMINI_BATCH_MAX_FILES", "8"))
+BATCH_OUTPUT_TOKENS = int(os.getenv("GEMINI_BATCH_OUTPUT_TOKENS", "16000"))
+
+PROMPT_VERSION = sha256_text(
+    SYSTEM_INSTRUCTION + REVIEW_PROMPT_TEMPLATE + CHUNK_CONTEXT_TEMPLATE + CHUNK_HEADER_TEMPLATE + DIFF_CONTEXT_TEMPLATE
+    + TRIAGE_CONTEXT_TEMPLATE + BATCH_PROMPT_TEMPLATE + BATCH_FILE_TEMPLATE
+)[:16]
+
+async def generate_llm_review_async(source_code: str, filename: str, language: str) -> Dict[str, Any]:
+    """
+    Generate review using Gemini without blocking the event loop.
+    Files over MAX_SOURCE_CHARS are split on function/class boundaries and the parts reviewed in parallel.
+    When earlier reviews cached some of the file's units, only the changed units are sent.
+    Trivial files are answered by local triage without calling Gemini; its findings are merged into every review.
+    Successful reviews are cached by content; fallbacks never are.
+    """
+    local_findings = []
+    if TRIAGE_ENABLED:
+        triage = triage_source(source_code, filename, language)
+        if triage["skip_reason"]:
+            return build_local_result(filename, triage["skip_reason"], triage["findings"])
+        local_findings = triage["findings"]
+    return await _review_file(source_code, filename, language, local_findings)
+
+async def generate_llm_reviews_async(files: Dict[str, tuple], semaphore: asyncio.Semaphore,
+                                     on_done: Optional[Callable[[str], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Review {filename: (source, language)} with at most semaphore's worth of requests in flight.
+    In GEMINI_BATCH_MODE, uncached small files are packed into shared requests (see _review_batch);
+    everything else goes through the single-file path. on_done(filename) is called as each file finishes.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, tuple] = {}
+
+    def _finish(fname: str, result: Dict[str, Any]):
+        results[fname] = result
+        if on_done:
+            on_done(fname)
+
+    # 1. Local triage and cache hits never need a request
+    for fname, (source_code, language) in files.items():
+        local_findings = []
+        if TRIAGE_ENABLED:
+            triage = triage_source(source_code, fname, language)
+            if triage["skip_reason"]:
+                _finish(fname, build_local_result(fname, triage["skip_reason"], triage["findings"]))
+                continue
+            local_findings = triage["findings"]
+        route = MODEL_ROUTER.route(source_code, language)
+        cached = await REVIEW_CACHE.get(make_cache_key(source_code, route["model"], language, PROMPT_VERSION)) if GEMINI_API_KEY else None
+        if cached is not None:
+            logger.info(f"Review cache hit for {fname}")
+            _finish(fname, cached)
+            continue
+        pending[fname] = (source_code, language, local_findings, route)
+
+    # 2. Pack the rest (per model tier); content another request is already reviewing joins that review instead
+    if GEMINI_BATCH_MODE and GEMINI_API_KEY:
+        joining = [f for f, (src, lang, _, route) in pending.items() if SINGLE_FLIGHT.in_flight(make_cache_key(src, route["model"], lang, PROMPT_VERSION))]
+        groups = [[f] for f in joining]
+        for tier in ModelRouter.TIERS:
+            groups += _pack_batches({f: v for f, v in pending.items() if f not in joining and v[3]["tier"] == tier})
+    else:
+        groups = [[f] for f in pending]
+
+    async def _run(group: List[str]):
+        async with semaphore:
+            if len(group) == 1:
+                source_code, language, local_findings, _ = pending[group[0]]
+                reviews = {group[0]: await _review_file(source_code, group[0], language, local_findings, cache_checked=True)}
+            else:
+                reviews = await _review_batch({f: pending[f] for f in group})
+        for fname in group:
+            _finish(fname, reviews[fname])
+
+    await asyncio.gather(*[_run(group) for group in groups])
+    return {fname: results[fname] for fname in files}
+
+def _pack_batches(pending: Dict[str, tuple]) -> List[List[str]]:
+    """Group small files (first-fit, largest first) up to BATCH_MAX_TOKENS / BATCH_MAX_FILES per request."""
+    groups: List[List[str]] = []
+    sizes: List[int] = []
+    for fname in sorted(pending, key=lambda f: -len(pending[f][0])):
+        tokens = estimate_tokens(pending[fname][0])
+        if tokens > BATCH_FILE_MAX_TOKENS:
+            groups.append([fname])
+            sizes.append(BATCH_MAX_TOKENS)
+            continue
+        for i, group in enumerate(groups):
+            if sizes[i] + tokens <= BATCH_MAX_TOKENS and len(group) < BATCH_MAX_FILES:
+                group.append(fname)
+                sizes[i] += tokens
+                break
+        else:
+            groups.append([fname])
+            sizes.append(tokens)
+    return groups
+
+async def _review_batch(batch: Dict[str, tuple]) -> Dict[str, Dict[str, Any]]:
+    """
+    Review several small files in one request and split the per-file JSON back out.
+    Files whose entry is missing or malformed (or the whole batch, if the call fails) are retried one by one.
+    """
+    with METRICS.time("prompt_build"):
+        sent = {fname: _compact(source_code, fname, language, True) for fname, (source_code, language, _, _) in batch.items()}
+        blocks = "".join(
+            BATCH_FILE_TEMPLATE.format(filename=fname, language=language, context=_triage_context(local_findings, sent[fname][1]), source_code=sent[fname][0])
+            for fname, (source_code, language, local_findings, _) in batch.items()
+        )
+        prompt = BATCH_PROMPT_TEMPLATE.format(count=len(batch), files=blocks)
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": 0.2, "maxOutputTokens": BATCH_OUTPUT_TOKENS}
+        }
+    route = next(iter(batch.values()))[3] # _pack_batches groups never mix tiers
+    logger.info(f"Batch request for {len(batch)} files ({route['tier']} tier): {', '.join(batch)}")
+    try:
+        data = await _call_gemini(prompt, payload, parse=lambda text: parse_model_json(text)[0], route=route)
+    except ReviewError as e:
+        logger.warning(f"Batch review failed ({e}); reviewing {len(batch)} files individually")
+        data = {}
+
+    reviews = {}
+    retry = []
+    for fname, (source_code, language, local_findings, _) in batch.items():
+        entry = data.get(fname) if isinstance(data, dict) else None
+        if not _valid_review(entry):
+            retry.append(fname)
+            continue
+        merge_local_findings(remap_findings(entry, sent[fname][1]), local_findings)
+        await REVIEW_CACHE.set(make_cache_key(source_code, route["model"], language, PROMPT_VERSION), entry)
+        reviews[fname] = entry
+
+    if retry:
+        logger.info(f"Batch: {len(retry)} of {len(batch)} files fall back to single requests")
+        singles = await asyncio.gather(*[_review_file(batch[f][0], f, batch[f][1], batch[f][2], cache_checked=True) for f in retry])
+        reviews.update(zip(retry, singles))
+    return reviews
+
+def _valid_review(entry: Any) -> bool:
+    return (isinstance(entry, dict) and isinstance(entry.get("findings"), list)
+            and isinstance(entry.get("rating"), dict) and all(isinstance(f, dict) for f in entry["findings"]))
+
+async def _review_file(source_code: str, filename: str, language: str, local_findings: List[Dict[str, Any]],
+                       cache_checked: bool = False) -> Dict[str, Any]:
+    """
+    Single-file review after triage: cache, incremental units, whole file or chunks.
+    Concurrent reviews of the same content share one in-flight review.
+    cache_checked skips the cache lookup when the caller has just missed on the same key.
+    """
+    if not GEMINI_API_KEY:
+        return merge_local_findings(_fallback_result(filename, language, "Missing API Key"), local_findings)
+
+    route = MODEL_ROUTER.route(source_code, language)
+    file_key = make_cache_key(source_code, route["model"], language, PROMPT_VERSION)
+    cached = None if cache_checked else await REVIEW_CACHE.get(file_key)
+    if cached is not None:
+        logger.info(f"Review cache hit for {filename}")
+        return cached
+
+    return await SINGLE_FLIGHT.do(file_key, lambda: _review_uncached(source_code, filename, language, local_findings, file_key, route))
+
+async def _review_uncached(source_code: str, filename: str, language: str,
+                           local_findings: List[Dict[str, Any]], file_key: str, route: Dict[str, str]) -> Dict[str, Any]:
+    logger.info(f"{filename}: {route['tier']} tier ({route['model']}, {route['reason']}{': ' + route['risks'] if route['risks'] else ''})")
+    units, header = split_units(source_code, language) if INCREMENTAL_REVIEW else ([], "")
+    if len(units) > 1:
+        result = await _incremental_review(source_code, units, header, filename, language, route)
+        if result is not None:
+            merge_local_findings(result, local_findings)
+            if not _is_fallback(result):
+                await REVIEW_CACHE.set(file_key, result)
+            return result
+
+    if len(source_code) <= MAX_SOURCE_CHARS:
+        try:
+            result = await _request_review(source_code, filename, language, route=route, local_findings=local_findings)
+        except ReviewError as e:
+            return merge_local_findings(_fallback_result(filename, language, str(e)), local_findings)
+    else:
+        chunks = split_source(source_code, language, CHUNK_CHARS)
+        logger.info(f"{filename}: {len(source_code)} chars, reviewing in {len(chunks)} chunks")
+        result = await review_segments_async(chunks, filename, language, route)
+
+    merge_local_findings(result, local_findings)
+    if not _is_fallback(result):
+        await REVIEW_CACHE.set(file_key, result)
+        if len(units) > 1:
+            await _store_units(source_code, units, result, language, route["model"])
+    return result
+
+def _triage_context(local_findings: Optional[List[Dict[str, Any]]], line_map: Optional[List[int]] = None) -> str:
+    """Static findings for the prompt, their lines moved onto the compacted source that is actually sent."""
+    if not local_findings:
+        return ""
+    findings = [{**f, "line": compacted_line(f.get("line"), line_map)} for f in local_findings]
+    return TRIAGE_CONTEXT_TEMPLATE.format(notes=describe_findings(findings))
+
+def _unit_key(unit_text: str, language: str, model: str) -> str:
+    return make_cache_key(unit_text, model, language, PROMPT_VERSION + ":unit")
+
+async def _store_units(source_code: str, units: List[tuple], result: Dict[str, Any], language: str, model: str,
+                       only: Optional[set] = None):
+    """
+    Cache a file review per unit: each finding goes to the unit containing its line (stored relative
+    to the unit start), and every unit keeps the file's rating and summary.
+    """
+    lines = source_code.splitlines(keepends=True)
+    per_unit = {i: [] for i in range(len(units))}
+    for f in result.get("findings", []):
+        line = as_int(f.get("line"))
+        idx = next((i for i, (s, e) in enumerate(units) if s <= line <= e), 0) # General findings -> first unit
+        f = dict(f)
+        if line > 0:
+            f["line"] = line - units[idx][0] + 1
+        per_unit[idx].append(f)
+
+    for i, (start, end) in enumerate(units):
+        if only is not None and i not in only:
+            continue
+        await REVIEW_CACHE.set(_unit_key("".join(lines[start - 1:end]), language, model), {
+            "findings": per_unit[i],
+            "rating": result.get("rating", {}),
+            "summary_markdown": result.get("summary_markdown", ""),
+        })
+
+async def _incremental_review(source_code: str, units: List[tuple], header: str,
+                              filename: str, language: str, route: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Reuse cached per-unit findings and send only changed units (with the file's signatures as context).
+    Returns None when no unit is cached, so the caller does a normal review.
+    """
+    lines = source_code.splitlines(keepends=True)
+    cached_units = {}
+    for i, (start, end) in enumerate(units):
+        entry = await REVIEW_CACHE.get(_unit_key("".join(lines[start - 1:end]), language, route["model"]), kind="unit")
+        if entry is not None:
+            cached_units[i] = entry
+    if not cached_units:
+        return None
+
+    changed = [i for i in range(len(units)) if i not in cached_units]
+    logger.info(f"{filename}: {len(cached_units)}/{len(units)} units unchanged, reviewing {len(changed)}")
+
+    # Runs of contiguous changed units, packed into CHUNK_CHARS segments like split_source's chunks
+    runs: List[List[int]] = []
+    for i in changed:
+        if runs and runs[-1][-1] == i - 1:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    segments = []
+    for run in runs:
+        for start, end in pack_units([units[i] for i in run], lines, CHUNK_CHARS):
+            segments.append({"start_line": start, "end_line": end, "header": header,
+                             "text": "".join(lines[start - 1:end])})
+
+    fresh = await review_segments_async(segments, filename, language, route) if segments else None
+    if fresh is not None and _is_fallback(fresh):
+        return fresh
+
+    # Cached findings are unit-relative; merge_chunk_reviews shifts them to the units' new positions
+    merged_chunks, merged_results = [], []
+    for i, entry in sorted(cached_units.items()):
+        merged_chunks.append({"start_line": units[i][0], "end_line": units[i][1]})
+        merged_results.append(entry)
+    merged = merge_chunk_reviews(merged_chunks, merged_results, filename)
+
+    findings = merged["findings"] + (fresh["findings"] if fresh else [])
+    findings.sort(key=lambda f: as_int(f.get("line")))
+    for n, f in enumerate(findings, 1):
+        f["id"] = f"F{n:03d}"
+
+    reused_lines = sum(units[i][1] - units[i][0] + 1 for i in cached_units)
+    fresh_lines = sum(s["end_line"] - s["start_line"] + 1 for s in segments)
+    rating = {}
+    for k in ("quality", "security", "maintainability", "overall"):
+        total = merged["rating"].get(k, 0.0) * reused_lines
+        if fresh:
+            total += as_float(fresh["rating"].get(k)) * fresh_lines
+        rating[k] = round(total / max(reused_lines + fresh_lines, 1), 1)
+
+    summary = fresh["summary_markdown"] if fresh else f"## Summary\n\nNo changes since the last review of `{filename}`."
+    summary += f"\n\n_{len(cached_units)} of {len(units)} units unchanged; their findings were reused._"
+    result = {"summary_markdown": summary, "findings": findings, "rating": rating}
+
+    if fresh:
+        await _store_units(source_code, units, result, language, route["model"], only=set(changed))
+    return result
+
+def _is_fallback(result: Dict[str, Any]) -> bool:
+    """True if any part of the review came from _fallback_result."""
+    return any(f.get("category") == "infrastructure" and str(f.get("id", "")).startswith("ERR")
+               for f in result.get("findings", []))
+
+async def review_segments_async(segments: List[Dict[str, Any]], filename: str, language: str,
+                                route: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """
-    Generate review using Gemini.
-    Handles 429 Retry logic.
+    Review line ranges of one file in parallel and merge them into a single review.
+    Each segment: {"start_line", "end_line", "text", "header"} plus optional "changed"
+    (file line numbers touched by a diff, which switches on the pull-request prompt).
+    All segments use the file's model tier (route); without one it is picked from the segments' text.
     """
     if not GEMINI_API_KEY:
         return _fallback_result(filename, language, "Missing API Key")
+    route = route or MODEL_ROUTER.route("".join(seg["text"] for seg in segments), language)
 
-    prompt = REVIEW_PROMPT_TEMPLATE.format(
-        language=language,
-        filename=filename,
-        source_code=source_code[:30000] # Safe chars limit
-    )
+    semaphore = asyncio.Semaphore(CHUNK_MAX_CONCURRENCY)
 
-    url = API_URL_TEMPLATE.format(model=GEMINI_MODEL, key=GEMINI_API_KEY)
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.2, "maxOutputTokens": 4000}
-    }
+    async def _review_segment(i: int, segment: Dict[str, Any]):
+        context = CHUNK_CONTEXT_TEMPLATE.format(
+            part=i + 1, parts=len(segments), start_line=segment["start_line"], end_line=segment["end_line"]
+        )
+        if segment.get("header"):
+            context += CHUNK_HEADER_TEMPLATE.format(language=language, header=segment["header"])
+        if segment.get("changed"):
+            offset = segment["start_line"] - 1
+            context += DIFF_CONTEXT_TEMPLATE.format(changed=", ".join(str(l - offset) for l in segment["changed"]))
+        async with semaphore:
+            # Diff context names segment lines, so changed segments are sent verbatim
+            return await _cached_review(segment["text"], filename, language, context, compact=not segment.get("changed"), route=route)
+
+    results = await asyncio.gather(*[_review_segment(i, seg) for i, seg in enumerate(segments)])
+    return merge_chunk_reviews(segments, results, filename)
+
+async def _cached_review(source_code: str, filename: str, language: str, context: str = "", compact: bool = True,
+                         route: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Review one prompt-sized piece of code. Successful reviews are cached by content; fallbacks never are."""
+    route = route or MODEL_ROUTER.route(source_code, language)
+    cache_key = make_cache_key(source_code + context, route["model"], language, PROMPT_VERSION)
+    cached = await REVIEW_CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"Review cache hit for {filename}")
+        return cached
+
+    async def _review():
+        try:
+            result = await _request_review(source_code, filename, language, context, compact, route)
+        except ReviewError as e:
+            return _fallback_result(filename, language, str(e))
+        await REVIEW_CACHE.set(cache_key, result)
+        return result
+
+    return await SINGLE_FLIGHT.do(cache_key, _review)
+
+def _build_request(source_code: str, filename: str, language: str, context: str = "", cached_content: Optional[str] = None):
+    """
+    Return (prompt, generateContent payload). prompt is the full text (instruction + file) for token accounting.
+    With cached_content the instruction is referenced by handle instead of sent.
+    """
+    with METRICS.time("prompt_build"):
+        suffix = REVIEW_PROMPT_TEMPLATE.format(
+            language=language,
+            filename=filename,
+            context=context,
+            source_code=source_code
+        )
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": suffix}]}],
+            "generationConfig": {"temperature": 0.2, "maxOutputTokens": output_token_budget(estimate_tokens(source_code))}
+        }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        else:
+            payload["systemInstruction"] = {"parts": [{"text": SYSTEM_INSTRUCTION}]}
+    return SYSTEM_INSTRUCTION + suffix, payload
+
+def _compact(source_code: str, filename: str, language: str, compact: bool = True):
+    """(source to send, line map or None). Findings on the sent source go through remap_findings."""
+    if not (compact and PROMPT_COMPACTION):
+        return source_code, None
+    return compact_source(source_code, filename, language)
+
+async def _instruction_handle(model: str) -> Optional[str]:
+    """cachedContents handle for SYSTEM_INSTRUCTION on model (None = send it inline)."""
+    return await CONTEXT_CACHE.get(_get_async_client(), GEMINI_BASE_URL, GEMINI_API_KEY, model,
+                                   PROMPT_VERSION, SYSTEM_INSTRUCTION)
+
+async def _request_review(source_code: str, filename: str, language: str, context: str = "", compact: bool = True,
+                          route: Optional[Dict[str, str]] = None,
+                          local_findings: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Call Gemini and parse the review JSON.
+    The source is compacted first (compact=False sends it verbatim); finding lines refer to the original.
+    local_findings (triage) are listed in the prompt against the lines of the source as sent.
+    The model comes from route (default: MODEL_ROUTER picks one for this source).
+    Handles 429 Retry logic. Raises ReviewError on failure.
+    """
+    route = route or MODEL_ROUTER.route(source_code, language)
+    sent, line_map = _compact(source_code, filename, language, compact)
+    context += _triage_context(local_findings, line_map)
+    handle = await _instruction_handle(route["model"])
+    prompt, payload = _build_request(sent, filename, language, context, handle)
+    try:
+        result = await _call_gemini(prompt, payload, route=route)
+    except CachedContentError as e:
+        logger.warning(f"Cached instruction rejected ({e}); sending it inline")
+        CONTEXT_CACHE.invalidate(route["model"], PROMPT_VERSION)
+        prompt, payload = _build_request(sent, filename, language, context)
+        result = await _call_gemini(prompt, payload, route=route)
+    return remap_findings(result, line_map)
+
+async def _call_gemini(prompt: str, payload: Dict[str, Any], parse: Callable[[str], Any] = parse_review_json,
+                       route: Optional[Dict[str, str]] = None) -> Any:
+    """
+    POST a generateContent payload to route's model and return the reply parsed by parse (default: one repaired review).
+    A reply that can't be repaired is retried while attempts remain. Raises ReviewError on failure,
+    immediately if the model's circuit is open.
+    """
+    route = route or MODEL_ROUTER.default_route()
+    model = route["model"]
+    url = API_URL_TEMPLATE.format(model=model, key=GEMINI_API_KEY)
 
     retries = 3
     base_wait = 20 # Wait longer for free tier
+    client = _get_async_client()
+    prompt_tokens = estimate_tokens(prompt)
 
     for attempt in range(retries):
         try:
-            logger.info(f"Calling Gemini ({GEMINI_MODEL}) - Attempt {attempt+1}/{retries}")
-            resp = requests.post(url, json=payload, timeout=60) # High timeout for large files
+            if not GEMINI_CIRCUIT.allow(model, "generateContent"):
+                raise ReviewError(GEMINI_CIRCUIT.reason(model, "generateContent"))
+            await GEMINI_RATE_LIMITER.acquire(model, prompt_tokens)
+            if attempt:
+                METRICS.inc("gemini_retries_total")
+            logger.info(f"Calling Gemini ({model}) - Attempt {attempt+1}/{retries}")
+            started = time.perf_counter()
+            with METRICS.time("gemini", tier=route["tier"]):
+                resp = await GEMINI_HEDGER.run(
+                    model, lambda: client.post(url, json=payload),
+                    admit=lambda: GEMINI_RATE_LIMITER.try_acquire(model, prompt_tokens), # Hedges are paced too
+                    ok=lambda r: r.status_code == 200,
+                )
+            GEMINI_CIRCUIT.record(model, "generateContent", not _backend_failed(resp.status_code, payload))
             
             if resp.status_code == 200:
                 data = resp.json()
+                _count_tokens(data)
+                MODEL_ROUTER.record(route, time.perf_counter() - started, data.get("usageMetadata"))
                 try:
-                    raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
-                    clean_text = clean_json_response(raw_text)
-                    return json.loads(clean_text)
-                except (KeyError, IndexError, json.JSONDecodeError) as e:
+                    with METRICS.time("json_parse"):
+                        raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
+                        return parse(raw_text)
+                except (KeyError, IndexError, TypeError, JsonRepairError) as e:
                     logger.error(f"Failed to parse success response: {e}")
-                    # If parsing fails, retry might not help, but let's try strict repair if needed
-                    # For now, return fallback with raw text
-                    return _fallback_result(filename, language, f"Parse Error: {e}")
+                    if attempt == retries - 1:
+                        raise ReviewError(f"Parse Error: {e}")
+                    continue # Sampling differs per call; a fresh reply is usually clean
 
             elif resp.status_code == 429:
-                logger.warning(f"Rate Limited (429). Waiting {base_wait}s...")
-                time.sleep(base_wait * (attempt + 1)) # Linear backoff 20, 40, 60
+                METRICS.inc("gemini_rate_limited_total")
+                await GEMINI_RATE_LIMITER.penalize(model)
+                if GEMINI_CIRCUIT.is_open(model, "generateContent"):
+                    raise ReviewError(GEMINI_CIRCUIT.reason(model, "generateContent"))
+                logger.warning(f"Rate Limited (429). Waiting {base_wait * (attempt + 1)}s...")
+                await asyncio.sleep(base_wait * (attempt + 1)) # Linear backoff 20, 40, 60
                 continue
+
+            elif "cachedContent" in payload and resp.status_code in (400, 403, 404):
+                raise CachedContentError(f"{resp.status_code}: {resp.text[:200]}")
             
             elif resp.status_code == 404:
-                return _fallback_result(filename, language, f"Model {GEMINI_MODEL} not found (404). Check .env")
+                raise ReviewError(f"Model {model} not found (404). Check .env")
 
             else:
                 error_details = resp.text[:500] # Capture first 500 chars of error
                 logger.error(f"API Error {resp.status_code}: {error_details}")
-                return _fallback_result(filename, language, f"API Error {resp.status_code}: {error_details}")
+                raise ReviewError(f"API Error {resp.status_code}: {error_details}")
 
+        except (ReviewError, CachedContentError):
+            raise
+        except asyncio.CancelledError:
+            GEMINI_CIRCUIT.release(model, "generateContent")
+            raise
         except Exception as e:
             logger.error(f"Network Exception: {e}")
-            time.sleep(5)
+            GEMINI_CIRCUIT.record(model, "generateContent", False)
+            if GEMINI_CIRCUIT.is_open(model, "generateContent"):
+                raise ReviewError(GEMINI_CIRCUIT.reason(model, "generateContent"))
+            await asyncio.sleep(5)
     
-    return _fallback_result(filename, language, "Rate Limit Exceeded (Fallback)")
+    raise ReviewError("Rate Limit Exceeded (Fallback)")
+
+def _backend_failed(status: int, payload: Dict[str, Any]) -> bool:
+    """Statuses that mean Gemini (or our key/quota) is unusable right now, as opposed to a bad request."""
+    if "cachedContent" in payload and status == 403:
+        return False # A stale cache handle; the request is re-sent inline
+    return status in (401, 403, 429) or status >= 500
+
+async def stream_llm_review(source_code: str, filename: str, language: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of generate_llm_review_async.
+    Yields {"type": "finding", "finding": {...}} as each finding's object closes,
+    then one {"type": "result", "structured": {...}} with the full review.
+    """
+    if not GEMINI_API_KEY or len(source_code) > MAX_SOURCE_CHARS:
+        # Nothing to stream (no key, or a chunked review): emit the finished result
+        result = await generate_llm_review_async(source_code, filename, language)
+        async for event in _replay(result):
+            yield event
+        return
+
+    triage = triage_source(source_code, filename, language) if TRIAGE_ENABLED else {"skip_reason": None, "findings": []}
+    if triage["skip_reason"]:
+        async for event in _replay(build_local_result(filename, triage["skip_reason"], triage["findings"])):
+            yield event
+        return
+
+    route = MODEL_ROUTER.route(source_code, language)
+    cache_key = make_cache_key(source_code, route["model"], language, PROMPT_VERSION)
+    cached = await REVIEW_CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"Review cache hit for {filename}")
+    elif SINGLE_FLIGHT.in_flight(cache_key):
+        logger.info(f"Joining in-flight review of {filename}")
+        cached = await _review_file(source_code, filename, language, triage["findings"], cache_checked=True)
+    if cached is not None:
+        async for event in _replay(cached):
+            yield event
+        return
+
+    local_findings = triage["findings"]
+    for finding in local_findings:
+        yield {"type": "finding", "finding": finding}
+
+    result = None
+    try:
+        async for event in _stream_request(source_code, filename, language, route=route, local_findings=local_findings):
+            if event["type"] == "result":
+                result = event["structured"]
+            else:
+                yield event
+    except ReviewError as e:
+        fallback = _fallback_result(filename, language, str(e))
+        for finding in fallback["findings"]:
+            yield {"type": "finding", "finding": finding}
+        yield {"type": "result", "structured": merge_local_findings(fallback, local_findings)}
+        return
+
+    merge_local_findings(result, local_findings)
+    await REVIEW_CACHE.set(cache_key, result)
+    yield {"type": "result", "structured": result}
+
+async def _replay(result: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    for finding in result.get("findings", []):
+        yield {"type": "finding", "finding": finding}
+    yield {"type": "result", "structured": result}
+
+async def _stream_request(source_code: str, filename: str, language: str, context: str = "",
+                          route: Optional[Dict[str, str]] = None,
+                          local_findings: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Call streamGenerateContent and parse findings incrementally.
+    Retries only before the first finding is emitted. Raises ReviewError on failure.
+    """
+    route = route or MODEL_ROUTER.route(source_code, language)
+    model = route["model"]
+    sent, line_map = _compact(source_code, filename, language)
+    context += _triage_context(local_findings, line_map)
+    prompt, payload = _build_request(sent, filename, language, context, await _instruction_handle(model))
+    url = STREAM_URL_TEMPLATE.format(model=model, key=GEMINI_API_KEY)
+
+    retries = 3
+    base_wait = 20 # Wait longer for free tier
+    client = _get_async_client()
+    prompt_tokens = estimate_tokens(prompt)
+
+    for attempt in range(retries):
+        parser = FindingStreamParser()
+        try:
+            if not GEMINI_CIRCUIT.allow(model, "streamGenerateContent"):
+                raise ReviewError(GEMINI_CIRCUIT.reason(model, "streamGenerateContent"))
+            await GEMINI_RATE_LIMITER.acquire(model, prompt_tokens)
+            if attempt:
+                METRICS.inc("gemini_retries_total")
+            logger.info(f"Streaming Gemini ({model}) - Attempt {attempt+1}/{retries}")
+            started = time.perf_counter()
+            usage = None
+            async with client.stream("POST", url, json=payload) as resp:
+                GEMINI_CIRCUIT.record(model, "streamGenerateContent", not _backend_failed(resp.status_code, payload))
+                if resp.status_code == 429:
+                    METRICS.inc("gemini_rate_limited_total")
+                    await GEMINI_RATE_LIMITER.penalize(model)
+                elif "cachedContent" in payload and resp.status_code in (400, 403, 404):
+                    logger.warning(f"Cached instruction rejected ({resp.status_code}); sending it inline")
+                    CONTEXT_CACHE.invalidate(model, PROMPT_VERSION)
+                    prompt, payload = _build_request(sent, filename, language, context)
+                    continue
+                elif resp.status_code == 404:
+                    raise ReviewError(f"Model {model} not found (404). Check .env")
+                elif resp.status_code != 200:
+                    error_details = (await resp.aread()).decode("utf-8", errors="ignore")[:500]
+                    logger.error(f"API Error {resp.status_code}: {error_details}")
+                    raise ReviewError(f"API Error {resp.status_code}: {error_details}")
+                else:
+                    first = True
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        if first:
+                            METRICS.observe("gemini_first_token", time.perf_counter() - started, tier=route["tier"])
+                            first = False
+                        chunk = _stream_payload(line[5:])
+                        usage = chunk.get("usageMetadata") or usage # Running totals; the last chunk has the final counts
+                        for finding in parser.feed(_stream_text(chunk)):
+                            if "line" in finding:
+                                finding["line"] = remap_line(finding["line"], line_map)
+                            yield {"type": "finding", "finding": finding}
+            METRICS.observe("gemini", time.perf_counter() - started, tier=route["tier"])
+            if resp.status_code == 200:
+                MODEL_ROUTER.record(route, time.perf_counter() - started, usage)
+
+            if resp.status_code == 429:
+                if GEMINI_CIRCUIT.is_open(model, "streamGenerateContent"):
+                    raise ReviewError(GEMINI_CIRCUIT.reason(model, "streamGenerateContent"))
+                logger.warning(f"Rate Limited (429). Waiting {base_wait * (attempt + 1)}s...")
+                await asyncio.sleep(base_wait * (attempt + 1)) # Linear backoff 20, 40, 60
+                continue
+
+            try:
+                with METRICS.time("json_parse"):
+                    result = remap_findings(parse_review_json(parser.buffer), line_map)
+            except JsonRepairError as e:
+                logger.error(f"Failed to parse streamed response: {e}")
+                raise ReviewError(f"Parse Error: {e}")
+            yield {"type": "result", "structured": result}
+            return
+
+        except ReviewError:
+            raise
+        except asyncio.CancelledError:
+            GEMINI_CIRCUIT.release(model, "streamGenerateContent")
+            raise
+        except Exception as e:
+            GEMINI_CIRCUIT.record(model, "streamGenerateContent", False)
+            if parser.emitted:
+                # Findings already went to the client; a retry would duplicate them
+                raise ReviewError(f"Stream interrupted: {e}")
+            logger.error(f"Network Exception: {e}")
+            if GEMINI_CIRCUIT.is_open(model, "streamGenerateContent"):
+                raise ReviewError(GEMINI_CIRCUIT.reason(model, "streamGenerateContent"))
+            await asyncio.sleep(5)
+
+    raise ReviewError("Rate Limit Exceeded (Fallback)")
+
+def _count_tokens(data: Dict[str, Any]):
+    """Uncached vs cached prompt tokens from a generateContent reply's usageMetadata."""
+    usage = data.get("usageMetadata") or {}
+    cached = usage.get("cachedContentTokenCount", 0)
+    METRICS.inc("gemini_prompt_tokens_total", usage.get("promptTokenCount", 0) - cached, kind="uncached")
+    METRICS.inc("gemini_prompt_tokens_total", cached, kind="cached")
+
+def _stream_payload(data: str) -> Dict[str, Any]:
+    """One streamGenerateContent SSE payload ({} if it isn't a JSON object)."""
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return {}
+    return chunk if isinstance(chunk, dict) else {}
+
+def _stream_text(chunk: Dict[str, Any]) -> str:
+    """Text delta from one parsed streamGenerateContent SSE payload."""
+    try:
+        parts = chunk["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    return "".join(p.get("text", "") for p in parts)
+
+def generate_llm_review(source_code: str, filename: str, language: str) -> Dict[str, Any]:
+    """Blocking wrapper around generate_llm_review_async for scripts (must not be called from a running loop)."""
+    async def _run():
+        try:
+            return await generate_llm_review_async(source_code, filename, language)
+        finally:
+            await close_async_client()
+    return asyncio.run(_run())
 
 def _fallback_result(filename: str, language: str, reason: str) -> Dict[str, Any]:
     """Mock result when API fails."""
+    METRICS.inc("review_fallbacks_total")
     return {
         "summary_markdown": f"## Summary\n\n**Fallback Review** for `{filename}`.\n\nReason: {reason}",
         "findings": [
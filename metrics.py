@@ -0,0 +1,105 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple, Optional
+
+# Stage latency buckets (seconds): covers ~1 ms prompt builds up to multi-minute Gemini retries
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRIC_HELP = {
+    "review_stage_seconds": "Time spent per review stage",
+    "gemini_rate_limited_total": "Gemini responses with status 429",
+    "gemini_retries_total": "Gemini request attempts after the first",
+    "review_fallbacks_total": "Reviews that returned the fallback result",
+    "review_cache_hits_total": "Review cache hits by tier and kind (file or unit)",
+    "review_cache_misses_total": "Review cache misses by kind (file or unit)",
+    "bytes_processed_total": "Bytes of uploaded source read, by origin",
+    "gemini_prompt_tokens_total": "Prompt tokens reported by Gemini, uncached vs served from a context cache",
+    "prompt_tokens_saved_total": "Estimated source tokens removed by prompt compaction",
+    "gemini_requests_total": "Successful Gemini calls by model tier",
+    "gemini_cost_usd_total": "Estimated Gemini spend in USD by model tier (list prices, usageMetadata tokens)",
+    "gemini_hedges_total": "Hedged Gemini calls by whether the hedge or the original answered first",
+    "gemini_circuit_rejected_total": "Gemini calls refused by an open circuit breaker",
+    "gemini_circuit_transitions_total": "Circuit breaker state changes by model, endpoint and new state",
+}
+
+class Metrics:
+    """
+    In-process counters and stage histograms, rendered in the Prometheus text format.
+    Recording is a dict update under a lock, so it is cheap enough for every request.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], list] = {} # key -> [bucket counts..., sum, count]
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, stage: str, seconds: float, **labels):
+        """Record one duration in review_stage_seconds{stage=..., **labels}."""
+        key = ("review_stage_seconds", (("stage", stage),) + tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    @contextmanager
+    def time(self, stage: str, **labels):
+        """with METRICS.time("zip"): ... (also fine around awaits)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def render(self, sampled: Optional[Dict[str, Tuple[str, str, float]]] = None) -> str:
+        """Prometheus text exposition. sampled: {name: (type, help, value)} read by the caller from other stats."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = []
+        for name in sorted({k[0] for k in counters}):
+            lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} counter"]
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        for name in sorted({k[0] for k in histograms}):
+            lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(self.buckets, hist):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(hist[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {hist[-1]}")
+
+        for name, (kind, help_text, value) in sorted((sampled or {}).items()):
+            if value is None:
+                continue # Not measured yet on this worker
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in labels)
+    return "{" + inner + "}"
+
+def _number(value: Any) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+METRICS = Metrics()
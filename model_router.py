@@ -0,0 +1,106 @@
+import os
+import re
+import threading
+from typing import Dict, Any, Optional
+from utils import get_logger
+from metrics import METRICS
+
+logger = get_logger("ModelRouter")
+
+# Security-sensitive code goes to the strong tier regardless of size
+RISK_PATTERNS = {
+    "network": re.compile(r"\bsocket\b|\bServerSocket\b|\bhttp\.createServer\b|\bnet\.(Listen|Dial)\b|\burlopen\s*\(", re.IGNORECASE),
+    "sql": re.compile(r"\b(SELECT|INSERT|UPDATE|DELETE)\b[^\n]*\b(FROM|INTO|SET|WHERE)\b|\b(executeQuery|prepareStatement|rawQuery)\s*\(|\bcursor\.execute\s*\("),
+    "eval": re.compile(r"\beval\s*\(|\bexec\s*\(|\bnew\s+Function\s*\(|\bRuntime\.getRuntime\(\)\.exec\b|\bshell\s*=\s*True|\bchild_process\b|\bsystem\s*\("),
+    "crypto": re.compile(r"\bhashlib\b|\bcrypto\b|\bCipher\b|\bMessageDigest\b|\bmd5\b|\bsha1\b|\bopenssl\b|\bjwt\b|\bbcrypt\b", re.IGNORECASE),
+    "deserialization": re.compile(r"\bpickle\.loads?\b|\byaml\.load\s*\(|\bObjectInputStream\b|\bunserialize\s*\("),
+}
+
+# USD per 1M (input, output) tokens, paid-tier list prices; extend with GEMINI_MODEL_PRICES="model=in/out,..."
+MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+CACHED_INPUT_DISCOUNT = 0.25 # Context-cached prompt tokens bill at a quarter of the input price
+
+for _entry in filter(None, os.getenv("GEMINI_MODEL_PRICES", "").split(",")):
+    try:
+        _model, _prices = _entry.split("=")
+        _in, _out = _prices.split("/")
+        MODEL_PRICES[_model.strip()] = (float(_in), float(_out))
+    except ValueError:
+        logger.warning(f"Ignoring malformed GEMINI_MODEL_PRICES entry: {_entry!r}")
+
+class ModelRouter:
+    """
+    Picks a model tier per file: "strong" for security-sensitive or very large files,
+    "fast" for small ones, "standard" (GEMINI_MODEL) otherwise.
+    Records per-tier requests, latency, tokens and estimated cost so the cut-offs can be tuned.
+    """
+
+    TIERS = ("fast", "standard", "strong")
+
+    def __init__(self, standard_model: str, fast_model: str, strong_model: str,
+                 fast_max_lines: int, strong_min_lines: int, risk_routing: bool = True):
+        self.models = {"fast": fast_model, "standard": standard_model, "strong": strong_model}
+        self.fast_max_lines = fast_max_lines
+        self.strong_min_lines = strong_min_lines
+        self.risk_routing = risk_routing
+        self._lock = threading.Lock()
+        self.stats = {tier: {"requests": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "reasons": {}}
+                      for tier in self.TIERS}
+
+    def route(self, source_code: str, language: str) -> Dict[str, str]:
+        """{"tier", "model", "reason"} for one file (or the whole file a chunk belongs to)."""
+        lines = source_code.count("\n") + 1
+        risks = [name for name, pattern in RISK_PATTERNS.items() if pattern.search(source_code)] if self.risk_routing else []
+        if risks:
+            tier, reason = "strong", "risk"
+        elif lines >= self.strong_min_lines:
+            tier, reason = "strong", "large"
+        elif lines <= self.fast_max_lines:
+            tier, reason = "fast", "small"
+        else:
+            tier, reason = "standard", "medium"
+        return {"tier": tier, "model": self.models[tier], "reason": reason, "risks": ",".join(risks)}
+
+    def default_route(self) -> Dict[str, str]:
+        return {"tier": "standard", "model": self.models["standard"], "reason": "default", "risks": ""}
+
+    def record(self, route: Dict[str, str], seconds: float, usage: Optional[Dict[str, Any]]):
+        """One successful Gemini call on route: latency plus usageMetadata-based tokens and cost."""
+        usage = usage or {}
+        cached = usage.get("cachedContentTokenCount", 0)
+        input_tokens = usage.get("promptTokenCount", 0)
+        output_tokens = usage.get("candidatesTokenCount", 0) + usage.get("thoughtsTokenCount", 0)
+        price_in, price_out = MODEL_PRICES.get(route["model"], (0.0, 0.0))
+        cost = ((input_tokens - cached + cached * CACHED_INPUT_DISCOUNT) * price_in + output_tokens * price_out) / 1e6
+
+        with self._lock:
+            tier = self.stats[route["tier"]]
+            tier["requests"] += 1
+            tier["seconds"] += seconds
+            tier["input_tokens"] += input_tokens
+            tier["output_tokens"] += output_tokens
+            tier["cost_usd"] += cost
+            tier["reasons"][route["reason"]] = tier["reasons"].get(route["reason"], 0) + 1
+        METRICS.inc("gemini_requests_total", tier=route["tier"], model=route["model"])
+        METRICS.inc("gemini_cost_usd_total", cost, tier=route["tier"], model=route["model"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = {name: {**t, "reasons": dict(t["reasons"])} for name, t in self.stats.items()}
+        for name, t in tiers.items():
+            t["model"] = self.models[name]
+            t["priced"] = self.models[name] in MODEL_PRICES
+            t["mean_seconds"] = round(t["seconds"] / t["requests"], 3) if t["requests"] else 0.0
+            t["cost_per_request_usd"] = round(t["cost_usd"] / t["requests"], 6) if t["requests"] else 0.0
+            t["seconds"] = round(t["seconds"], 3)
+            t["cost_usd"] = round(t["cost_usd"], 6)
+        return {
+            "thresholds": {"fast_max_lines": self.fast_max_lines, "strong_min_lines": self.strong_min_lines, "risk_routing": self.risk_routing},
+            "tiers": tiers,
+        }
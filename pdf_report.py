@@ -1,23 +1,165 @@
-
 import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.sax.saxutils import escape
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from utils import get_logger
+from metrics import METRICS
+
+logger = get_logger("PDFReport")
+
+# Report builds run in a process pool so layout never holds the API's GIL (0 = run in a thread)
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", "2"))
+
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
+_STYLES = None
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+def _get_styles():
+    """Sample stylesheet, built once per process (styles are never mutated)."""
+    global _STYLES
+    if _STYLES is None:
+        _STYLES = getSampleStyleSheet()
+    return _STYLES
+
+def _warm_worker():
+    """Pool initializer: pay reportlab import and stylesheet cost once per worker."""
+    _get_styles()
+
+def _ping() -> int:
+    return os.getpid()
+
+def get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    global _PDF_POOL
+    if PDF_POOL_WORKERS <= 0:
+        return None
+    if _PDF_POOL is None:
+        _PDF_POOL = ProcessPoolExecutor(
+            max_workers=PDF_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"), # Never fork the running event loop
+            initializer=_warm_worker,
+        )
+    return _PDF_POOL
+
+async def warm_pdf_pool():
+    """Start every pool worker now so the first report doesn't pay process start-up."""
+    pool = get_pdf_pool()
+    if pool is None:
+        return
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*[loop.run_in_executor(pool, _ping) for _ in range(PDF_POOL_WORKERS)])
+    logger.info(f"PDF pool ready: {len(set(pids))} workers")
+
+def shutdown_pdf_pool():
+    global _PDF_POOL
+    if _PDF_POOL is not None:
+        _PDF_POOL.shutdown(wait=False, cancel_futures=True)
+        _PDF_POOL = None
+
+async def _run_build(fn, *args):
+    with METRICS.time("pdf_build"):
+        return await _dispatch_build(fn, *args)
+
+async def _dispatch_build(fn, *args):
+    global _PDF_POOL
+    pool = get_pdf_pool()
+    if pool is None:
+        return await asyncio.to_thread(fn, *args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool as e:
+        # A worker died; drop the pool (next call builds a fresh one) and finish this report in a thread
+        logger.error(f"PDF pool broken ({e}). Rebuilding")
+        if _PDF_POOL is pool:
+            _PDF_POOL = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return await asyncio.to_thread(fn, *args)
+
+async def build_pdf_report_async(review_data: Dict[str, Any], output_path: str, filename: str):
+    """build_pdf_report off the event loop (process pool)."""
+    await _run_build(build_pdf_report, review_data, output_path, filename)
+
+async def build_pdf_report_multi_async(files_map: Dict[str, Dict[str, Any]], output_path: str, metadata: Dict[str, Any]):
+    """build_pdf_report_multi off the event loop (process pool)."""
+    await _run_build(build_pdf_report_multi, files_map, output_path, metadata)
 
 def build_pdf_report(review_data: Dict[str, Any], output_path: str, filename: str):
     doc = SimpleDocTemplate(output_path, pagesize=A4)
-    styles = getSampleStyleSheet()
+    styles = _get_styles()
     story = []
 
     # Title
     title_style = styles["Title"]
-    story.append(Paragraph(f"Code Review Report: {filename}", title_style))
+    story.append(Paragraph(f"Code Review Report: {_text(filename)}", title_style))
     story.append(Spacer(1, 12))
 
-    # Ratings Table
-    rating = review_data.get("rating", {})
+    _append_review(story, review_data, styles)
+    doc.build(story)
+
+def build_pdf_report_multi(files_map: Dict[str, Dict[str, Any]], output_path: str, metadata: Dict[str, Any]):
+    """
+    Combined report for several files.
+    files_map: {filename: {"source": str, "language": str, "structured": review_data}}
+    metadata: {"report_id", "date", "time"} plus optional "rating" (aggregate) and "title".
+    """
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    styles = _get_styles()
+    story = []
+
+    # Title
+    story.append(Paragraph(_text(metadata.get("title", "Code Review Report")), styles["Title"]))
+    story.append(Paragraph(
+        f"Report ID: {_text(metadata.get('report_id', 'N/A'))} | {_text(metadata.get('date', ''))} {_text(metadata.get('time', ''))}",
+        styles["Normal"]
+    ))
+    story.append(Spacer(1, 12))
+
+    # Aggregate rating (if provided)
+    if metadata.get("rating"):
+        story.append(Paragraph("Overall Rating", styles["Heading2"]))
+        story.append(_rating_table(metadata["rating"]))
+        story.append(Spacer(1, 24))
+
+    # Files overview
+    story.append(Paragraph("Files Reviewed", styles["Heading2"]))
+    overview = [["File", "Language", "Findings", "Overall"]]
+    for fname, entry in files_map.items():
+        structured = entry.get("structured", {})
+        overview.append([
+            Paragraph(_text(fname), styles["BodyText"]),
+            entry.get("language", "text"),
+            str(len(structured.get("findings", []))),
+            str(structured.get("rating", {}).get("overall", "N/A")),
+        ])
+    t = Table(overview, colWidths=[230, 80, 70, 70], repeatRows=1)
+    t.setStyle(TABLE_STYLE)
+    story.append(t)
+
+    # Per-file sections
+    for fname, entry in files_map.items():
+        story.append(PageBreak())
+        story.append(Paragraph(f"File: {_text(fname)}", styles["Heading1"]))
+        story.append(Spacer(1, 12))
+        _append_review(story, entry.get("structured", {}), styles)
+
+    doc.build(story)
+
+def _rating_table(rating: Dict[str, Any]) -> Table:
     rating_data = [
         ["Metric", "Score"],
         ["Quality", str(rating.get("quality", "N/A"))],
@@ -26,21 +168,22 @@ def build_pdf_report(review_data: Dict[str, Any], output_path: str, filename: st
         ["Overall", str(rating.get("overall", "N/A"))]
     ]
     t = Table(rating_data, colWidths=[200, 100])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(t)
+    t.setStyle(TABLE_STYLE)
+    return t
+
+def _text(value: Any) -> str:
+    """Model output and source snippets as Paragraph text: <, > and & would otherwise be parsed as markup."""
+    return escape(str(value))
+
+def _append_review(story: List[Any], review_data: Dict[str, Any], styles):
+    """Ratings table, summary and findings for one review."""
+    # Ratings Table
+    story.append(_rating_table(review_data.get("rating", {})))
     story.append(Spacer(1, 24))
 
     # Summary
     story.append(Paragraph("Executive Summary", styles["Heading2"]))
-    summary_text = review_data.get("summary_markdown", "").replace("\n", "<br/>")
+    summary_text = _text(review_data.get("summary_markdown", "")).replace("\n", "<br/>")
     story.append(Paragraph(summary_text, styles["BodyText"]))
     story.append(Spacer(1, 24))
 
@@ -59,15 +202,13 @@ def build_pdf_report(review_data: Dict[str, Any], output_path: str, filename: st
         elif severity == "HIGH": color = colors.orange
         elif severity == "MEDIUM": color = colors.brown
 
-        header_text = f"<b>[{severity}] {f.get('title', 'Issue')} (Line {f.get('line', '?')})</b>"
+        header_text = f"<b>[{_text(severity)}] {_text(f.get('title', 'Issue'))} (Line {_text(f.get('line', '?'))})</b>"
         story.append(Paragraph(header_text, styles["Heading3"]))
         
         # Details
-        story.append(Paragraph(f"<b>Category:</b> {f.get('category', 'General')}", styles["Normal"]))
-        story.append(Paragraph(f"<b>Description:</b> {f.get('description', '')}", styles["Normal"]))
-        story.append(Paragraph(f"<b>Recommendation:</b> {f.get('recommendation', '')}", styles["Normal"]))
+        story.append(Paragraph(f"<b>Category:</b> {_text(f.get('category', 'General'))}", styles["Normal"]))
+        story.append(Paragraph(f"<b>Description:</b> {_text(f.get('description', ''))}", styles["Normal"]))
+        story.append(Paragraph(f"<b>Recommendation:</b> {_text(f.get('recommendation', ''))}", styles["Normal"]))
         story.append(Spacer(1, 12))
         story.append(Paragraph("-" * 60, styles["Normal"]))
         story.append(Spacer(1, 12))
-
-    doc.build(story)
@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Any
+from utils import get_logger
+
+logger = get_logger("RateLimiter")
+
+# Configuration (0 disables a bucket)
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "0"))
+# SQLite file shared by all workers on the host; "memory" keeps buckets per process
+GEMINI_RATE_LIMIT_DB = os.getenv("GEMINI_RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "gemini_rate_limit.sqlite3"))
+
+MAX_SLEEP = 5.0 # Re-check at least this often while waiting
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token estimate (~4 chars per token)."""
+    return max(len(text) // 4, 1)
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets.
+    Each bucket holds up to one minute of quota and refills continuously.
+    A request only proceeds when every enabled bucket can cover its cost.
+    """
+
+    def __init__(self, rpm: float, tpm: float, db_path: str = "memory"):
+        self.capacity = {name: limit for name, limit in (("requests", rpm), ("tokens", tpm)) if limit > 0}
+        self.db_path = db_path
+        self._local: Dict[str, list] = {} # bucket key -> [level, updated]
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "throttled": 0, "wait_seconds": 0.0, "penalties": 0}
+        if self.enabled and self.shared:
+            self._init_db()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.capacity)
+
+    @property
+    def shared(self) -> bool:
+        return self.db_path != "memory"
+
+    async def acquire(self, model: str, tokens: int) -> float:
+        """Wait until the model's buckets can cover one request of `tokens`. Returns seconds waited."""
+        if not self.enabled:
+            return 0.0
+        cost = self._cost(tokens)
+
+        waited = 0.0
+        while True:
+            wait = await self._take(model, cost)
+            if wait <= 0:
+                break
+            wait = min(wait, MAX_SLEEP)
+            await asyncio.sleep(wait)
+            waited += wait
+
+        with self._lock:
+            self.stats["acquired"] += 1
+            if waited:
+                self.stats["throttled"] += 1
+                self.stats["wait_seconds"] += waited
+        if waited:
+            logger.info(f"Paced Gemini call for {model} by {waited:.1f}s")
+        return waited
+
+    async def try_acquire(self, model: str, tokens: int) -> bool:
+        """Take one request of `tokens` only if the buckets can cover it right now (never waits)."""
+        if not self.enabled:
+            return True
+        if await self._take(model, self._cost(tokens)) > 0:
+            return False
+        with self._lock:
+            self.stats["acquired"] += 1
+        return True
+
+    async def penalize(self, model: str):
+        """Empty the model's request bucket after a 429 so every caller backs off together."""
+        if "requests" not in self.capacity:
+            return
+        with self._lock:
+            self.stats["penalties"] += 1
+        await self._take(model, {"requests": 0}, drain=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 2)
+        stats["rpm"] = self.capacity.get("requests", 0)
+        stats["tpm"] = self.capacity.get("tokens", 0)
+        stats["shared"] = self.shared
+        return stats
+
+    # --- Bucket math ---
+
+    def _cost(self, tokens: int) -> Dict[str, float]:
+        cost = {"requests": 1, "tokens": tokens}
+        # A single oversized request must still be able to pass once the bucket is full
+        return {name: min(cost[name], cap) for name, cap in self.capacity.items()}
+
+    def _refill(self, name: str, level: float, updated: float, now: float) -> float:
+        cap = self.capacity[name]
+        return min(cap, level + (now - updated) * cap / 60.0)
+
+    def _settle(self, buckets: Dict[str, list], cost: Dict[str, float], now: float, drain: bool) -> float:
+        """Refill, then take the cost (or drain). Mutates buckets; returns seconds to wait (0 = taken)."""
+        for name, state in buckets.items():
+            state[0] = self._refill(name, state[0], state[1], now)
+            state[1] = now
+        if drain:
+            for name in cost:
+                buckets[name][0] = 0.0
+            return 0.0
+        wait = 0.0
+        for name, amount in cost.items():
+            deficit = amount - buckets[name][0]
+            if deficit > 0:
+                wait = max(wait, deficit * 60.0 / self.capacity[name])
+        if wait > 0:
+            return wait
+        for name, amount in cost.items():
+            buckets[name][0] -= amount
+        return 0.0
+
+    async def _take(self, model: str, cost: Dict[str, float], drain: bool = False) -> float:
+        if self.shared:
+            return await asyncio.to_thread(self._take_sqlite, model, cost, drain)
+        return self._take_local(model, cost, drain)
+
+    def _take_local(self, model: str, cost: Dict[str, float], drain: bool) -> float:
+        now = time.time()
+        with self._lock:
+            buckets = {}
+            for name in self.capacity:
+                key = f"{model}:{name}"
+                buckets[name] = self._local.setdefault(key, [self.capacity[name], now])
+            return self._settle(buckets, cost, now, drain)
+
+    # --- SQLite backend (cross-process) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def _init_db(self):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, level REAL, updated REAL)")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared rate limit DB unavailable ({e}). Using per-process buckets")
+            self.db_path = "memory"
+
+    def _take_sqlite(self, model: str, cost: Dict[str, float], drain: bool) -> float:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE") # Serialises the read-modify-write across workers
+            buckets = {}
+            for name in self.capacity:
+                row = conn.execute("SELECT level, updated FROM buckets WHERE key = ?", (f"{model}:{name}",)).fetchone()
+                buckets[name] = list(row) if row else [self.capacity[name], now]
+            wait = self._settle(buckets, cost, now, drain)
+            for name, (level, updated) in buckets.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, level, updated) VALUES (?, ?, ?)",
+                    (f"{model}:{name}", level, updated)
+                )
+            conn.execute("COMMIT")
+            return wait
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limit DB error ({e}). Letting request through")
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            return 0.0
+        finally:
+            conn.close()
+
+GEMINI_RATE_LIMITER = TokenBucketLimiter(GEMINI_RPM, GEMINI_TPM, GEMINI_RATE_LIMIT_DB)
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+from utils import get_logger, generate_report_id
+
+logger = get_logger("ReportStore")
+
+# Configuration
+REPORT_STORE_DIR = os.getenv("REPORT_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports"))
+REPORT_STORE_MAX_MB = float(os.getenv("REPORT_STORE_MAX_MB", "500"))
+REPORT_STORE_MAX_AGE = float(os.getenv("REPORT_STORE_MAX_AGE", str(30 * 24 * 3600))) # Seconds
+
+class ReportStore:
+    """
+    Reports on shared disk, addressed by report_id.
+    PDF and JSON live under <root>/<id[:2]>/; a SQLite index (primary key lookup) lets any worker find them.
+    Old reports are evicted by age and total size after each save.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_age: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = os.path.join(root, "index.sqlite3")
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "report_id TEXT PRIMARY KEY, title TEXT, pdf_path TEXT, json_path TEXT, size INTEGER, created REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_created ON reports (created)")
+
+    def new_report(self) -> Tuple[str, str]:
+        """Reserve a report id and return (report_id, pdf output path)."""
+        report_id = generate_report_id()
+        while self.get(report_id) is not None:
+            report_id = generate_report_id()
+        folder = os.path.join(self.root, report_id[:2])
+        os.makedirs(folder, exist_ok=True)
+        return report_id, os.path.join(folder, f"{report_id}.pdf")
+
+    def save(self, report_id: str, payload: Dict[str, Any], title: str = ""):
+        """Write the JSON payload next to the already-built PDF and index both."""
+        folder = os.path.join(self.root, report_id[:2])
+        pdf_path = os.path.join(folder, f"{report_id}.pdf")
+        json_path = os.path.join(folder, f"{report_id}.json")
+        tmp_path = f"{json_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, json_path)
+
+        size = os.path.getsize(json_path) + (os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (report_id, title, pdf_path, json_path, size, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (report_id, title, pdf_path, json_path, size, time.time())
+            )
+        self.evict()
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT report_id, title, pdf_path, json_path, size, created FROM reports WHERE report_id = ?",
+                (report_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT report_id, title, pdf_path, json_path, size, created FROM reports ORDER BY created DESC LIMIT 1"
+            ).fetchone()
+        return self._row(row)
+
+    def load_json(self, report_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.get(report_id)
+        if not entry:
+            return None
+        try:
+            with open(entry["json_path"], "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def evict(self):
+        """Drop reports past max_age, then the oldest until total size fits max_bytes."""
+        now = time.time()
+        doomed = []
+        with self._connect() as conn:
+            doomed += conn.execute(
+                "SELECT report_id, pdf_path, json_path FROM reports WHERE created < ?", (now - self.max_age,)
+            ).fetchall()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM reports WHERE created >= ?", (now - self.max_age,)).fetchone()[0]
+            if total > self.max_bytes:
+                for report_id, pdf_path, json_path, size in conn.execute(
+                    "SELECT report_id, pdf_path, json_path, size FROM reports WHERE created >= ? ORDER BY created", (now - self.max_age,)
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((report_id, pdf_path, json_path))
+                    total -= size
+            conn.executemany("DELETE FROM reports WHERE report_id = ?", [(d[0],) for d in doomed])
+        for _, pdf_path, json_path in doomed:
+            for path in (pdf_path, json_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if doomed:
+            logger.info(f"Evicted {len(doomed)} reports")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reports").fetchone()
+        return {"reports": count, "bytes": total, "max_bytes": self.max_bytes, "max_age_seconds": self.max_age}
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed (sqlite3's own context manager only commits)."""
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _row(self, row) -> Optional[Dict[str, Any]]:
+        if not row:
+            return None
+        entry = dict(zip(("report_id", "title", "pdf_path", "json_path", "size", "created"), row))
+        if time.time() - entry["created"] > self.max_age:
+            return None
+        return entry
+
+REPORT_STORE = ReportStore(REPORT_STORE_DIR, int(REPORT_STORE_MAX_MB * 1024 * 1024), REPORT_STORE_MAX_AGE)
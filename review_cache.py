@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import copy
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable
+from utils import get_logger, env_flag
+from metrics import METRICS
+
+logger = get_logger("ReviewCache")
+
+# Configuration
+REVIEW_CACHE_ENABLED = env_flag("REVIEW_CACHE_ENABLED", True)
+REVIEW_CACHE_DIR = os.getenv("REVIEW_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".review_cache"))
+REVIEW_CACHE_MEMORY_ENTRIES = int(os.getenv("REVIEW_CACHE_MEMORY_ENTRIES", "256"))
+REVIEW_CACHE_DISK_MB = float(os.getenv("REVIEW_CACHE_DISK_MB", "100"))
+REVIEW_CACHE_TTL = float(os.getenv("REVIEW_CACHE_TTL", str(7 * 24 * 3600))) # Seconds
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+def make_cache_key(source_code: str, model: str, language: str, prompt_version: str) -> str:
+    """Content address for a review: source hash + model + language + prompt version."""
+    parts = [sha256_text(source_code), model, language, prompt_version]
+    return sha256_text("\x00".join(parts))
+
+class ReviewCache:
+    """
+    Two-tier review cache.
+    Memory: LRU bounded by entry count. Disk: one JSON file per key, bounded by total size.
+    Both tiers expire entries older than the TTL.
+    get/set are coroutines: the memory tier is served on the loop, disk I/O runs in a worker thread.
+    Lookups of per-unit entries (kind="unit") are counted apart from whole-review lookups.
+    """
+
+    def __init__(self, cache_dir: str, memory_entries: int, disk_max_bytes: int, ttl: float, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict() # key -> (created, result)
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None # Computed lazily on first write
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "unit_hits": 0, "unit_misses": 0,
+                      "stores": 0, "evictions": 0, "expired": 0}
+
+    # --- Public API ---
+
+    async def get(self, key: str, kind: str = "file") -> Optional[Dict[str, Any]]:
+        """Cached result for key or None. kind="unit" marks incremental per-unit probes."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, result = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._count_hit("memory", kind)
+                    return copy.deepcopy(result)
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+        entry = await asyncio.to_thread(self._read_disk, key, now)
+        with self._lock:
+            if entry is None:
+                self.stats["unit_misses" if kind == "unit" else "misses"] += 1
+                METRICS.inc("review_cache_misses_total", kind=kind)
+                return None
+            self._count_hit("disk", kind)
+            self._remember(key, entry[0], entry[1])
+        return copy.deepcopy(entry[1])
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        created = time.time()
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._remember(key, created, result)
+            self.stats["stores"] += 1
+        await asyncio.to_thread(self._write_disk, key, created, result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        unit_lookups = stats["unit_hits"] + stats["unit_misses"]
+        stats["unit_hit_rate"] = round(stats["unit_hits"] / unit_lookups, 3) if unit_lookups else 0.0
+        stats["disk_bytes"] = self._disk_bytes or 0 # 0 until the first write scans the directory
+        return stats
+
+    def _count_hit(self, tier: str, kind: str):
+        # Called with the lock held
+        self.stats["unit_hits" if kind == "unit" else f"{tier}_hits"] += 1
+        METRICS.inc("review_cache_hits_total", tier=tier, kind=kind)
+
+    # --- Memory tier ---
+
+    def _remember(self, key: str, created: float, result: Dict[str, Any]):
+        self._memory[key] = (created, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # --- Disk tier ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str, now: float):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            created = float(entry["created"])
+            if now - created > self.ttl:
+                self._remove(path)
+                with self._lock:
+                    self.stats["expired"] += 1
+                return None
+            return created, entry["result"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping unreadable cache entry {key[:12]}: {e}")
+            self._remove(path)
+            return None
+
+    def _write_disk(self, key: str, created: float, result: Dict[str, Any]):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps({"created": created, "result": result})
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path) # Atomic so other workers never read a partial file
+        except OSError as e:
+            logger.warning(f"Could not write review cache entry: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data)
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _scan_disk_bytes(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, fname))
+                except OSError:
+                    pass
+        return total
+
+    def _evict_disk(self):
+        """Delete expired entries, then oldest entries until under ~90% of the budget."""
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                path = os.path.join(root, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        evicted = 0
+        for mtime, size, path in entries:
+            if total <= target and now - mtime <= self.ttl:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self.stats["evictions"] += evicted
+        if evicted:
+            logger.info(f"Evicted {evicted} review cache files ({total} bytes remain)")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class SingleFlight:
+    """
+    Coalesces concurrent reviews of the same cache key: the first caller runs the work,
+    later callers await its result (a deep copy each) instead of making their own Gemini call.
+    Only callers on the same event loop are coalesced.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, work: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        while True:
+            future = self._inflight.get(key)
+            if future is None or future.get_loop() is not loop:
+                break
+            self.stats["coalesced"] += 1
+            try:
+                return copy.deepcopy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled, not us: take over
+                self.stats["coalesced"] -= 1
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        self.stats["leaders"] += 1
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Mark retrieved when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats["leaders"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "in_flight": len(self._inflight),
+            "coalesced_ratio": round(self.stats["coalesced"] / total, 3) if total else 0.0,
+        }
+
+REVIEW_CACHE = ReviewCache(
+    cache_dir=REVIEW_CACHE_DIR,
+    memory_entries=REVIEW_CACHE_MEMORY_ENTRIES,
+    disk_max_bytes=int(REVIEW_CACHE_DISK_MB * 1024 * 1024),
+    ttl=REVIEW_CACHE_TTL,
+    enabled=REVIEW_CACHE_ENABLED,
+)
+
+SINGLE_FLIGHT = SingleFlight()
@@ -7,6 +7,10 @@ document.addEventListener("DOMContentLoaded", () => {
   const reviewZipBtn = document.getElementById("reviewZipBtn");
   const resultsDiv = document.getElementById("results");
 
+  // Review text quotes uploaded source (e.g. "<h1>..." lines); never insert it as markup
+  const escapeHtml = (value) =>
+    String(value ?? "").replace(/[&<>"']/g, (c) => ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" }[c]));
+
   // Helper to show loading animation
   const setLoading = (loading) => {
     if (loading) {
@@ -17,10 +21,10 @@ document.addEventListener("DOMContentLoaded", () => {
   // Function to render results nicely
   const showResults = (data) => {
     let html = `<div class="result-card"><h3>✅ Analysis complete</h3>`;
-    html += `<p><strong>Report ID:</strong> ${data.report_id}</p>`;
-    html += `<p><strong>Files processed:</strong> ${data.files.join(", ")}</p>`;
+    html += `<p><strong>Report ID:</strong> ${escapeHtml(data.report_id)}</p>`;
+    html += `<p><strong>Files processed:</strong> ${escapeHtml(data.files.join(", "))}</p>`;
     html += `<div class="button-row">
-                <a class="btn-primary" href="/api/download-latest" target="_blank">📥 Download Latest PDF</a>
+                <a class="btn-primary" href="${escapeHtml(data.report_url)}" target="_blank">📥 Download PDF Report</a>
              </div>`;
     html += `<h4>🧠 AI Review Preview:</h4>`;
     html += `<div class="ai-review">`;
@@ -28,12 +32,12 @@ document.addEventListener("DOMContentLoaded", () => {
     if (data.previews) {
       for (const [fname, content] of Object.entries(data.previews)) {
         html += `<div class="file-review">
-                   <h5>📄 ${fname}</h5>
-                   <pre>${content.llm_summary || "No summary"}</pre>
+                   <h5>📄 ${escapeHtml(fname)}</h5>
+                   <pre>${escapeHtml(content.llm_summary || "No summary")}</pre>
                  </div>`;
       }
     } else if (data.llm_summary) {
-      html += `<pre>${data.llm_summary}</pre>`;
+      html += `<pre>${escapeHtml(data.llm_summary)}</pre>`;
     }
     html += `</div></div>`;
     resultsDiv.innerHTML = html;
@@ -56,14 +60,64 @@ document.addEventListener("DOMContentLoaded", () => {
 
       if (!res.ok) {
         const errText = await res.text();
-        resultsDiv.innerHTML = `<div class="error">❌ Error: ${errText}</div>`;
+        resultsDiv.innerHTML = `<div class="error">❌ Error: ${escapeHtml(errText)}</div>`;
         return;
       }
 
       const data = await res.json();
       showResults(data);
     } catch (err) {
-      resultsDiv.innerHTML = `<div class="error">🚨 ${err.message}</div>`;
+      resultsDiv.innerHTML = `<div class="error">🚨 ${escapeHtml(err.message)}</div>`;
+    }
+  };
+
+  // Single-file review over Server-Sent Events: findings render as they arrive
+  const streamReview = async (file) => {
+    const formData = new FormData();
+    formData.append("file", file);
+
+    resultsDiv.innerHTML = `<div class="result-card"><h3>⏳ Reviewing ${escapeHtml(file.name)}...</h3><div class="ai-review" id="streamFindings"></div></div>`;
+    const findingsDiv = document.getElementById("streamFindings");
+
+    const handleEvent = (event, data) => {
+      if (event === "finding") {
+        findingsDiv.insertAdjacentHTML("beforeend",
+          `<div class="file-review"><h5>[${escapeHtml(String(data.severity || "info").toUpperCase())}] ${escapeHtml(data.title || "Issue")} (Line ${escapeHtml(data.line ?? "?")})</h5><pre>${escapeHtml(data.description)}</pre></div>`);
+      } else if (event === "done") {
+        const r = data.rating || {};
+        resultsDiv.querySelector("h3").textContent = "✅ Analysis complete";
+        findingsDiv.insertAdjacentHTML("beforebegin",
+          `<p><strong>Report ID:</strong> ${escapeHtml(data.report_id)} | <strong>Overall:</strong> ${escapeHtml(r.overall ?? "N/A")}</p>
+           <div class="button-row"><a class="btn-primary" href="${escapeHtml(data.report_url)}" target="_blank">📥 Download PDF Report</a></div>`);
+      } else if (event === "error") {
+        resultsDiv.innerHTML = `<div class="error">❌ Error: ${escapeHtml(data.detail)}</div>`;
+      }
+    };
+
+    try {
+      const res = await fetch("/api/review-stream", { method: "POST", body: formData });
+      if (!res.ok) {
+        resultsDiv.innerHTML = `<div class="error">❌ Error: ${escapeHtml(await res.text())}</div>`;
+        return;
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) >= 0) {
+          const block = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          const event = (block.match(/^event: (.*)$/m) || [])[1];
+          const data = (block.match(/^data: (.*)$/m) || [])[1];
+          if (event && data) handleEvent(event, JSON.parse(data));
+        }
+      }
+    } catch (err) {
+      resultsDiv.innerHTML = `<div class="error">🚨 ${escapeHtml(err.message)}</div>`;
     }
   };
 
@@ -75,7 +129,11 @@ document.addEventListener("DOMContentLoaded", () => {
       alert("Please select a file first.");
       return;
     }
-    uploadFiles("/api/review", "files", files);
+    if (files.length === 1) {
+      streamReview(files[0]);
+      return;
+    }
+    uploadFiles("/api/review-multi", "files", files);
   });
 
   reviewCombineBtn.addEventListener("click", () => {
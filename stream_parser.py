@@ -0,0 +1,63 @@
+import json
+from typing import Dict, Any, List, Optional
+
+class FindingStreamParser:
+    """
+    Incremental scanner for the review JSON as Gemini streams it.
+    feed() returns each object in the top-level "findings" array as soon as its closing brace arrives.
+    Strings and escapes are tracked so braces inside descriptions don't confuse the nesting.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None # Last string closed at depth 1 (candidate key)
+        self._top_key: Optional[str] = None # Key whose value is being read at depth 1
+        self._obj_start: Optional[int] = None
+        self.emitted = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self.buffer += text
+        found = []
+        buf = self.buffer
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = buf[self._string_start + 1:self._pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch == ":" and len(self._stack) == 1:
+                self._top_key = self._last_key
+            elif ch in "{[":
+                self._stack.append(ch)
+                if ch == "{" and self._in_findings_item():
+                    self._obj_start = self._pos
+            elif ch in "}]" and self._stack:
+                if ch == "}" and self._obj_start is not None and self._in_findings_item():
+                    try:
+                        finding = json.loads(buf[self._obj_start:self._pos + 1])
+                        if isinstance(finding, dict):
+                            found.append(finding)
+                    except json.JSONDecodeError:
+                        pass
+                    self._obj_start = None
+                self._stack.pop()
+            self._pos += 1
+        self.emitted += len(found)
+        return found
+
+    def _in_findings_item(self) -> bool:
+        """True while directly inside an object that is an element of the top-level findings array."""
+        return len(self._stack) == 3 and self._stack[:2] == ["{", "["] and self._top_key == "findings"
@@ -0,0 +1,48 @@
+# test_chunker.py
+"""Behaviour checks for splitting large files into chunks and merging the chunk reviews."""
+from chunker import split_source, merge_chunk_reviews
+
+PYTHON_SOURCE = "import os\n\n" + "".join(f"def f{i}(a):\n    b = a + {i}\n    return b\n\n" for i in range(30))
+
+def test_chunks_cover_every_line_once():
+    chunks = split_source(PYTHON_SOURCE, "python", 200)
+    assert len(chunks) > 1
+    assert chunks[0]["start_line"] == 1
+    assert chunks[-1]["end_line"] == PYTHON_SOURCE.count("\n")
+    assert all(b["start_line"] == a["end_line"] + 1 for a, b in zip(chunks, chunks[1:]))
+    assert "".join(c["text"] for c in chunks) == PYTHON_SOURCE
+
+def test_chunks_split_on_function_boundaries():
+    for chunk in split_source(PYTHON_SOURCE, "python", 200)[1:]:
+        assert chunk["text"].startswith("def ")
+        assert "import os" in chunk["header"] and "def f0(a):" in chunk["header"]
+
+def test_brace_language_chunks():
+    source = "".join(f"function f{i}(a) {{\n  if (a) {{ return '}}'; }}\n  return {i};\n}}\n" for i in range(20))
+    chunks = split_source(source, "javascript", 150)
+    assert all(c["text"].startswith("function ") for c in chunks)
+    assert "".join(c["text"] for c in chunks) == source
+
+def test_merge_shifts_lines_and_keeps_every_finding():
+    chunks = [{"start_line": 1, "end_line": 10}, {"start_line": 11, "end_line": 30}]
+    results = [
+        {"summary_markdown": "## Summary\n\nFirst.", "findings": [{"title": "SQL injection", "line": 10}],
+         "rating": {"quality": 8, "security": 4, "maintainability": 8, "overall": 6}},
+        # Same title on nearby lines in the next chunk: a separate issue, not a duplicate
+        {"summary_markdown": "## Summary\n\nSecond.", "findings": [{"title": "SQL injection", "line": 1},
+                                                                   {"title": "SQL injection", "line": 2}],
+         "rating": {"quality": 5, "security": 1, "maintainability": 5, "overall": 3}},
+    ]
+    merged = merge_chunk_reviews(chunks, results, "db.py")
+    assert [f["line"] for f in merged["findings"]] == [10, 11, 12]
+    assert [f["id"] for f in merged["findings"]] == ["F001", "F002", "F003"]
+    assert merged["rating"]["security"] == round((4 * 10 + 1 * 20) / 30, 1)
+    assert "**Lines 11-30:** Second." in merged["summary_markdown"]
+
+def test_merge_ignores_fallback_ratings():
+    chunks = [{"start_line": 1, "end_line": 5}, {"start_line": 6, "end_line": 9}]
+    results = [{"findings": [], "rating": {"quality": 7, "security": 7, "maintainability": 7, "overall": 7}},
+               {"findings": [{"title": "x", "line": "n/a"}], "rating": {}}]
+    merged = merge_chunk_reviews(chunks, results, "a.py")
+    assert merged["rating"]["overall"] == 7.0
+    assert merged["findings"][0]["line"] == 0
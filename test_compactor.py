@@ -0,0 +1,64 @@
+# test_compactor.py
+"""Behaviour checks for prompt compaction and the line numbers the prompt refers to."""
+import asyncio
+import llm_agent
+from compactor import compact_source, compacted_line, remap_line
+from triage import triage_source
+
+SOURCE = """# Copyright (c) 2024 Example Corp.
+# Licensed under the Apache License, Version 2.0.
+# You may not use this file except in compliance with the License.
+# See the LICENSE file for the full terms.
+# SPDX-License-Identifier: Apache-2.0
+#!/this/is/not/a/shebang
+
+
+import os
+
+
+def run(expr):
+    return eval(expr)
+
+
+def home():
+    return os.environ.get("HOME")
+"""
+
+def test_line_map_round_trip():
+    compacted, line_map = compact_source(SOURCE, "a.py", "python")
+    original = SOURCE.splitlines()
+    for n, text in enumerate(compacted.splitlines(), 1):
+        assert original[remap_line(n, line_map) - 1].rstrip() == text
+        assert compacted_line(remap_line(n, line_map), line_map) == n
+
+def test_dropped_lines_map_to_the_next_kept_line():
+    _, line_map = compact_source(SOURCE, "a.py", "python")
+    assert compacted_line(1, line_map) == 1 # Inside the dropped license header
+    assert compacted_line(10 ** 6, line_map) == len(line_map)
+    assert compacted_line(0, line_map) == 0 and compacted_line("n/a", line_map) == "n/a"
+    assert compacted_line(7, None) == 7
+
+def test_triage_notes_use_compacted_lines(monkeypatch):
+    prompts = []
+
+    async def fake_call(prompt, payload, parse=None, route=None):
+        prompts.append(prompt)
+        return {"summary_markdown": "## Summary\n\nok", "findings": [{"title": "x", "line": 3}], "rating": {}}
+
+    async def no_handle(model):
+        return None
+
+    monkeypatch.setattr(llm_agent, "_call_gemini", fake_call)
+    monkeypatch.setattr(llm_agent, "_instruction_handle", no_handle)
+    local = triage_source(SOURCE, "a.py", "python")["findings"]
+    eval_finding = next(f for f in local if "eval" in f["title"].lower())
+    assert eval_finding["line"] == 13
+
+    result = asyncio.run(llm_agent._request_review(SOURCE, "a.py", "python", local_findings=local))
+
+    compacted, line_map = compact_source(SOURCE, "a.py", "python")
+    sent_line = compacted_line(13, line_map)
+    assert "eval(expr)" in compacted.splitlines()[sent_line - 1]
+    assert f"- line {sent_line}: {eval_finding['title']}" in prompts[0]
+    assert "- line 13:" not in prompts[0]
+    assert result["findings"][0]["line"] == remap_line(3, line_map)
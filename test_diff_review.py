@@ -0,0 +1,66 @@
+# test_diff_review.py
+"""Behaviour checks for unified diff parsing and the line mapping of review segments."""
+from diff_review import parse_unified_diff, build_segments
+
+DIFF = """diff --git a/app/calc.py b/app/calc.py
+--- a/app/calc.py
++++ b/app/calc.py
+@@ -10,6 +10,7 @@ def total(items):
+ def add(a, b):
+     return a + b
+ 
+-def divide(a, b):
++def divide(a, b, default=None):
++    if b == 0:
++        return default
+     return a / b
+ 
+@@ -40,3 +41,2 @@ class Report:
+     def render(self):
+-        print("debug")
+         return self.body
+--- a/README.md
++++ b/README.md
+@@ -1 +1 @@
+-old
++new
+--- a/gone.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+-x = 1
+-y = 2
+"""
+
+def test_head_line_numbers():
+    files = parse_unified_diff(DIFF)
+    assert list(files) == ["app/calc.py"] # README is not reviewable, gone.py was deleted
+    change = files["app/calc.py"]
+    assert change["lines"][13] == "def divide(a, b, default=None):"
+    assert change["lines"][16] == "    return a / b"
+    assert change["lines"][41] == "    def render(self):"
+    assert change["lines"][42] == "        return self.body"
+    # Added lines, plus the line now sitting where "print" was deleted
+    assert change["changed"] == {13, 14, 15, 42}
+    assert change["total_lines"] == 42
+
+def test_hunk_body_that_looks_like_a_header():
+    diff = "--- a/x.py\n+++ b/x.py\n@@ -1,2 +1,2 @@\n--- a/old\n+++ b/new\n keep\n"
+    change = parse_unified_diff(diff)["x.py"]
+    assert change["lines"] == {1: "++ b/new", 2: "keep"}
+    assert change["changed"] == {1}
+
+def test_segments_map_back_to_head_lines():
+    change = parse_unified_diff(DIFF)["app/calc.py"]
+    segments = build_segments(change, context_lines=1)
+    assert [(s["start_line"], s["end_line"], s["changed"]) for s in segments] == [(12, 16, [13, 14, 15]), (41, 42, [42])]
+    first = segments[0]
+    text_lines = first["text"].splitlines()
+    for offset, line in enumerate(range(first["start_line"], first["end_line"] + 1)):
+        assert text_lines[offset] == change["lines"][line]
+
+def test_segments_split_at_size_limit():
+    change = {"lines": {i: f"x{i} = {i}" for i in range(1, 21)}, "changed": set(range(1, 21)), "header": "", "total_lines": 20}
+    segments = build_segments(change, context_lines=0, max_chars=40)
+    assert segments[0]["start_line"] == 1 and segments[-1]["end_line"] == 20
+    assert all(b["start_line"] == a["end_line"] + 1 for a, b in zip(segments, segments[1:]))
+    assert all(len(s["text"]) <= 40 for s in segments)
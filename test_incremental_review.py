@@ -0,0 +1,56 @@
+# test_incremental_review.py
+"""Behaviour checks for incremental re-review: only changed units are sent, in prompt-sized segments."""
+import asyncio
+import llm_agent
+from chunker import split_units
+from review_cache import ReviewCache
+from utils import RATING_KEYS
+
+def _setup(tmp_path, monkeypatch):
+    cache = ReviewCache(str(tmp_path), memory_entries=10000, disk_max_bytes=10 ** 9, ttl=3600)
+    monkeypatch.setattr(llm_agent, "REVIEW_CACHE", cache)
+    monkeypatch.setattr(llm_agent, "GEMINI_API_KEY", "test-key")
+    sent = []
+
+    async def fake_review(source_code, filename, language, context="", compact=True, route=None):
+        sent.append(source_code)
+        return {"summary_markdown": "## Summary\n\nok", "findings": [{"title": "x", "line": 1}],
+                "rating": {k: 7.0 for k in RATING_KEYS}}
+
+    monkeypatch.setattr(llm_agent, "_cached_review", fake_review)
+    return cache, sent
+
+def _cache_units(cache, source, units, route, indexes):
+    lines = source.splitlines(keepends=True)
+    for i in indexes:
+        start, end = units[i]
+        key = llm_agent._unit_key("".join(lines[start - 1:end]), "python", route["model"])
+        asyncio.run(cache.set(key, {"findings": [], "rating": {k: 9.0 for k in RATING_KEYS}, "summary_markdown": ""}))
+
+def test_large_changed_run_is_split_at_chunk_size(tmp_path, monkeypatch):
+    cache, sent = _setup(tmp_path, monkeypatch)
+    source = "".join(f"def f{i}(a):\n    b = a + {i}\n    c = b * 2\n    return c\n\n" for i in range(2001))
+    assert len(source) > llm_agent.MAX_SOURCE_CHARS * 2
+    units, header = split_units(source, "python")
+    route = llm_agent.MODEL_ROUTER.route(source, "python")
+    _cache_units(cache, source, units, route, [0]) # Everything but the first unit changed
+
+    result = asyncio.run(llm_agent._incremental_review(source, units, header, "big.py", "python", route))
+
+    lines = source.splitlines(keepends=True)
+    assert len(sent) > 1
+    assert all(len(text) <= llm_agent.CHUNK_CHARS for text in sent)
+    assert "".join(sent) == "".join(lines[units[0][1]:])
+    assert len(result["findings"]) == len(sent)
+
+def test_separate_changed_runs_stay_separate(tmp_path, monkeypatch):
+    cache, sent = _setup(tmp_path, monkeypatch)
+    source = "".join(f"def f{i}(a):\n    b = a + {i}\n    c = b * 2\n    return c\n\n" for i in range(10))
+    units, header = split_units(source, "python")
+    route = llm_agent.MODEL_ROUTER.route(source, "python")
+    _cache_units(cache, source, units, route, [0, 1, 4, 5, 6, 9])
+
+    result = asyncio.run(llm_agent._incremental_review(source, units, header, "small.py", "python", route))
+
+    assert [text.count("def ") for text in sent] == [2, 2]
+    assert [f["line"] for f in result["findings"]] == [units[2][0], units[7][0]]
@@ -0,0 +1,64 @@
+# test_json_repair.py
+"""Behaviour checks for recovering review JSON from damaged model output."""
+import json
+import pytest
+from json_repair import parse_model_json, parse_review_json, JsonRepairError
+
+def test_clean_json_needs_no_repair():
+    assert parse_model_json('{"a": [1, 2]}') == ({"a": [1, 2]}, [])
+
+def test_fences_and_prose():
+    value, repairs = parse_model_json('Here you go:\n{"a": 1}\nHope this helps')
+    assert value == {"a": 1} and repairs == ["surrounding_text"]
+    assert parse_model_json('```json\n{"a": 1}\n```') == ({"a": 1}, [])
+
+def test_raw_control_characters_in_strings():
+    value, repairs = parse_model_json('{"summary_markdown": "line\nnext\tcol\rend"}')
+    assert value["summary_markdown"] == "line\nnext\tcol\rend"
+    assert repairs == ["control_characters"]
+
+def test_single_quotes_and_apostrophes():
+    value, repairs = parse_model_json("{'title': 'it's fine', 'note': 'He said \"hi\"',}")
+    assert value == {"title": "it's fine", "note": 'He said "hi"'}
+    assert "single_quotes" in repairs and "trailing_commas" in repairs
+
+def test_doubled_commas():
+    value, repairs = parse_model_json('{"a": [1,, 2,], "b": 3,}')
+    assert value == {"a": [1, 2], "b": 3} and "trailing_commas" in repairs
+
+def test_truncated_inside_a_finding_drops_it():
+    value, repairs = parse_model_json('{"findings":[{"title":"a"},{"title":"b","li')
+    assert value == {"findings": [{"title": "a"}]} and "truncated" in repairs
+    value, _ = parse_model_json('{"findings":[{"title":"a"},{"title":"b","meta":{"x":1,"y')
+    assert value == {"findings": [{"title": "a"}]}
+
+def test_truncated_between_findings_keeps_them():
+    value, _ = parse_model_json('{"findings":[{"title":"a"},{"title":"b"},')
+    assert value == {"findings": [{"title": "a"}, {"title": "b"}]}
+    value, _ = parse_model_json('{"findings":[{"title":"a"}], "summary_markdown": "cut')
+    assert value == {"findings": [{"title": "a"}]}
+
+def test_unrepairable():
+    with pytest.raises(JsonRepairError):
+        parse_model_json("no json here")
+    with pytest.raises(JsonRepairError):
+        parse_model_json('{"summary_markdown": "cut')
+
+def test_review_fills_missing_fields():
+    review = parse_review_json(json.dumps({"findings": [{"title": "x"}, "junk", {"severity": "high"}]}))
+    assert len(review["findings"]) == 1
+    assert review["findings"][0]["line"] == 0 and review["findings"][0]["severity"] == "info"
+    assert set(review["rating"]) == {"quality", "security", "maintainability", "overall"}
+    assert review["summary_markdown"].startswith("## Summary")
+
+def test_braces_in_leading_prose():
+    value, repairs = parse_model_json('Here is {the} review: {"findings": [{"title": "a"}], "summary_markdown": "ok"}')
+    assert value == {"findings": [{"title": "a"}], "summary_markdown": "ok"} and repairs == ["surrounding_text"]
+    value, repairs = parse_model_json('Result {x}: {"findings": [{"title": "a"},, {"title": "b", "li')
+    assert value == {"findings": [{"title": "a"}]}
+    assert repairs == ["surrounding_text", "trailing_commas", "truncated"]
+
+def test_only_applied_repairs_are_reported():
+    assert parse_model_json('{"a": [1, 2,]}')[1] == ["trailing_commas"]
+    assert parse_model_json('{"a": 1} and that is all')[1] == ["surrounding_text"]
+    assert parse_model_json('{"a": "x\ty"} done')[1] == ["control_characters", "surrounding_text"]
@@ -0,0 +1,37 @@
+# test_pdf_report.py
+"""Behaviour checks for PDF rendering of review text that looks like markup."""
+from pdf_report import build_pdf_report, build_pdf_report_multi
+from triage import triage_source
+
+MARKUP_FINDING = {
+    "id": "F001", "title": "Compare with < & <img>", "severity": "high", "line": 3, "category": "security",
+    "description": "`el.innerHTML = \"<img src=x onerror=alert(1)>\"` & `if (a<b && c>d)`",
+    "recommendation": "Use textContent; escape <, > & \" before insertion",
+}
+
+def _review(findings):
+    return {
+        "summary_markdown": "## Summary\n\nHandles a<b & c>d and </b> unbalanced tags.",
+        "findings": findings,
+        "rating": {"quality": 5, "security": 3, "maintainability": 6, "overall": 4.5},
+    }
+
+def test_markup_in_review_text_renders(tmp_path):
+    out = tmp_path / "report.pdf"
+    build_pdf_report(_review([MARKUP_FINDING]), str(out), "a<b>&.js")
+    assert out.read_bytes().startswith(b"%PDF")
+
+def test_local_findings_quoting_source_render(tmp_path):
+    sources = {
+        "copy.c": ("c", "void f(char *d, char *s, int n) {\n    for(int i=0;i<n;i++) strcpy(d, s);\n}\n"),
+        "Cmp.java": ("java", "class Cmp {\n    boolean f(int n, int b, String s) {\n        return n<b && s == \"x\";\n    }\n}\n"),
+        "dom.js": ("javascript", "function show(el) {\n    el.innerHTML = \"<img src=x>\";\n    eval(el.dataset.code);\n}\n"),
+    }
+    files_map = {}
+    for fname, (language, source) in sources.items():
+        findings = triage_source(source, fname, language)["findings"]
+        assert findings, fname
+        files_map[fname] = {"source": source, "language": language, "structured": _review(findings)}
+    out = tmp_path / "multi.pdf"
+    build_pdf_report_multi(files_map, str(out), {"report_id": "t", "date": "", "time": "", "title": "R & D <review>"})
+    assert out.read_bytes().startswith(b"%PDF")
@@ -0,0 +1,44 @@
+# test_stream_parser.py
+"""Behaviour checks for FindingStreamParser (findings emitted as the review JSON streams in)."""
+import json
+from stream_parser import FindingStreamParser
+
+REVIEW = {
+    "summary_markdown": "## Summary\n\nBraces { in } prose and a \"quoted\" word.",
+    "findings": [
+        {"id": "F001", "title": "Use of eval", "description": "eval(\"{x}\") runs input", "line": 3, "meta": {"tags": ["a", "b"]}},
+        {"id": "F002", "title": "Bare except", "description": "Escaped \\\" quote and \\\\ backslash", "line": 9},
+    ],
+    "rating": {"quality": 6, "security": 4, "maintainability": 7, "overall": 5.5},
+}
+
+def _feed_in_pieces(text, size):
+    parser = FindingStreamParser()
+    found = []
+    for i in range(0, len(text), size):
+        found.extend(parser.feed(text[i:i + size]))
+    return parser, found
+
+def test_emits_each_finding_whatever_the_chunking():
+    text = json.dumps(REVIEW)
+    for size in (1, 3, 7, 64, len(text)):
+        parser, found = _feed_in_pieces(text, size)
+        assert found == REVIEW["findings"], size
+        assert parser.emitted == 2
+
+def test_finding_emitted_as_soon_as_it_closes():
+    text = json.dumps(REVIEW)
+    cut = text.index('"F002"')
+    parser = FindingStreamParser()
+    assert [f["id"] for f in parser.feed(text[:cut])] == ["F001"]
+    assert [f["id"] for f in parser.feed(text[cut:])] == ["F002"]
+
+def test_ignores_objects_outside_findings():
+    text = json.dumps({"rating": {"quality": 5}, "other": [{"title": "not a finding"}], "findings": [{"title": "real"}]})
+    _, found = _feed_in_pieces(text, 5)
+    assert found == [{"title": "real"}]
+
+def test_truncated_finding_is_not_emitted():
+    text = json.dumps(REVIEW)
+    _, found = _feed_in_pieces(text[:text.index('"Bare except"')], 4)
+    assert [f["id"] for f in found] == ["F001"]
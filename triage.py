@@ -0,0 +1,187 @@
+import os
+import re
+import ast
+from typing import Dict, Any, List, Optional
+from utils import get_logger, env_flag, as_int, StatsCounter, RATING_KEYS
+
+logger = get_logger("Triage")
+
+# Configuration
+TRIAGE_ENABLED = env_flag("TRIAGE_ENABLED", True)
+TRIAGE_MIN_CODE_LINES = int(os.getenv("TRIAGE_MIN_CODE_LINES", "3"))
+
+GENERATED_MARKERS = re.compile(r"@generated|auto-?generated|do not edit|generated by", re.IGNORECASE)
+COMMENT_LINE = re.compile(r"^\s*(#|//|/\*|\*|--|<!--)")
+SECRET = re.compile(r"""(password|passwd|pwd|secret|api[_-]?key|token)\w*\s*[:=]\s*["'][^"']{4,}["']""", re.IGNORECASE)
+
+SEVERITY_PENALTY = {"critical": 3.0, "high": 2.0, "medium": 1.0, "low": 0.5, "info": 0.0}
+
+# (languages, pattern, title, severity, category, recommendation)
+REGEX_RULES = [
+    ({"javascript", "typescript", "react", "php"}, re.compile(r"\beval\s*\("),
+     "Use of eval", "critical", "security", "Avoid eval; parse or dispatch explicitly."),
+    ({"javascript", "typescript", "react"}, re.compile(r"\.innerHTML\s*=[^=]"),
+     "Assignment to innerHTML", "high", "security", "Use textContent or sanitise HTML to prevent XSS."),
+    ({"javascript", "typescript", "react"}, re.compile(r"\bdocument\.write\s*\("),
+     "Use of document.write", "medium", "security", "Build DOM nodes instead of writing raw HTML."),
+    ({"c", "cpp"}, re.compile(r"\bgets\s*\("),
+     "Use of gets", "critical", "security", "gets cannot bound input; use fgets."),
+    ({"c", "cpp"}, re.compile(r"\b(strcpy|strcat)\s*\("),
+     "Unbounded string copy", "high", "security", "Use strncpy/strncat or snprintf with the buffer size."),
+    ({"c", "cpp"}, re.compile(r"\bsprintf\s*\("),
+     "Use of sprintf", "medium", "security", "Use snprintf with the buffer size."),
+    ({"c", "cpp", "php"}, re.compile(r"\bsystem\s*\("),
+     "Shell command execution", "high", "security", "Avoid system(); call the program directly with validated arguments."),
+    ({"java"}, re.compile(r"\"[^\"]*\"\s*[!=]=\s*\w|\w\s*[!=]=\s*\"[^\"]*\""),
+     "String compared with ==", "high", "robustness", "Compare strings with .equals()."),
+    ({"java"}, re.compile(r"catch\s*\(\s*\w+\s+\w+\s*\)\s*\{\s*\}"),
+     "Empty catch block", "medium", "robustness", "Handle or log the exception."),
+    ({"java"}, re.compile(r"Runtime\.getRuntime\(\)\.exec\s*\("),
+     "Shell command execution", "high", "security", "Use ProcessBuilder with validated arguments."),
+]
+
+TRIAGE_STATS = StatsCounter("files", "short_circuited", "local_findings", "llm_calls_saved")
+
+def triage_source(source_code: str, filename: str, language: str) -> Dict[str, Any]:
+    """
+    Cheap local pass before the LLM.
+    Returns {"skip_reason": str or None, "findings": [...]} where findings use the review schema.
+    A skip_reason means the file is trivial and build_local_result() should be used instead of Gemini.
+    """
+    findings = _python_findings(source_code) if language == "python" else _regex_findings(source_code, language)
+    findings += _secret_findings(source_code)
+    findings.sort(key=lambda f: f["line"])
+    for i, f in enumerate(findings, 1):
+        f["id"] = f"L{i:03d}"
+
+    skip_reason = _skip_reason(source_code, language)
+    skipped = int(skip_reason is not None)
+    TRIAGE_STATS.inc(files=1, local_findings=len(findings), short_circuited=skipped, llm_calls_saved=skipped)
+    if skip_reason:
+        logger.info(f"Triage: {filename} handled locally ({skip_reason})")
+    return {"skip_reason": skip_reason, "findings": findings}
+
+def build_local_result(filename: str, reason: str, findings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Review payload for a file that never went to Gemini."""
+    score = 10.0 - sum(SEVERITY_PENALTY.get(f["severity"], 0.0) for f in findings)
+    score = round(max(score, 0.0), 1)
+    return {
+        "summary_markdown": f"## Summary\n\n**Local triage** for `{filename}`: {reason}. No AI review was needed.",
+        "findings": findings,
+        "rating": {k: score for k in RATING_KEYS},
+    }
+
+def merge_local_findings(result: Dict[str, Any], findings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add static findings to an LLM review, skipping ones already present at the same line."""
+    existing = {(str(f.get("title", "")).lower(), f.get("line")) for f in result.get("findings", [])}
+    taken_lines = {(f.get("line"), str(f.get("category", "")).lower()) for f in result.get("findings", [])}
+    extra = [f for f in findings
+             if (f["title"].lower(), f["line"]) not in existing and (f["line"], f["category"]) not in taken_lines]
+    if extra:
+        result["findings"] = sorted(result.get("findings", []) + extra, key=lambda f: as_int(f.get("line")))
+    return result
+
+def describe_findings(findings: List[Dict[str, Any]]) -> str:
+    """One line per static finding, for the prompt."""
+    return "\n".join(f"- line {f['line']}: {f['title']}" for f in findings)
+
+# --- Trivial-file detection ---
+
+def _skip_reason(source_code: str, language: str) -> Optional[str]:
+    if not source_code.strip():
+        return "empty file"
+    if language == "json":
+        return "data file (JSON)"
+    lines = source_code.splitlines()
+    head = "\n".join(lines[:5])
+    if GENERATED_MARKERS.search(head):
+        return "generated code"
+    if len(lines) <= 3 and len(source_code) > 5000:
+        return "minified code"
+    code_lines = [l for l in lines if l.strip() and not COMMENT_LINE.match(l)]
+    if len(code_lines) < TRIAGE_MIN_CODE_LINES:
+        return f"only {len(code_lines)} line(s) of code"
+    return None
+
+# --- Rules ---
+
+def _finding(line: int, title: str, severity: str, category: str, description: str, recommendation: str) -> Dict[str, Any]:
+    return {
+        "id": "",
+        "title": title,
+        "description": description,
+        "severity": severity,
+        "line": line,
+        "recommendation": recommendation,
+        "category": category,
+    }
+
+def _python_findings(source_code: str) -> List[Dict[str, Any]]:
+    try:
+        tree = ast.parse(source_code)
+    except SyntaxError as e:
+        return [_finding(e.lineno or 0, "Syntax error", "high", "robustness",
+                         f"File does not parse: {e.msg}.", "Fix the syntax error.")]
+
+    findings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ExceptHandler) and node.type is None:
+            findings.append(_finding(node.lineno, "Bare except", "high", "robustness",
+                                     "A bare except also catches KeyboardInterrupt and SystemExit and hides real errors.",
+                                     "Catch specific exceptions (at least `except Exception`)."))
+        elif isinstance(node, ast.Call):
+            name = _call_name(node.func)
+            if name in ("eval", "exec"):
+                findings.append(_finding(node.lineno, f"Use of {name}", "critical", "security",
+                                         f"`{name}` executes arbitrary code.", "Use ast.literal_eval or explicit dispatch."))
+            elif name == "os.system" or (name.startswith("subprocess.") and _kw_true(node, "shell")):
+                findings.append(_finding(node.lineno, "Shell command execution", "high", "security",
+                                         f"`{name}` runs through the shell and is open to injection.",
+                                         "Call subprocess.run with an argument list and shell=False."))
+            elif name in ("pickle.load", "pickle.loads"):
+                findings.append(_finding(node.lineno, "Unsafe deserialisation", "high", "security",
+                                         "Unpickling untrusted data can execute code.", "Use JSON or a safe format."))
+            elif name == "yaml.load" and not any(k.arg == "Loader" for k in node.keywords):
+                findings.append(_finding(node.lineno, "yaml.load without Loader", "medium", "security",
+                                         "yaml.load without a Loader can construct arbitrary objects.", "Use yaml.safe_load."))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+                if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                    findings.append(_finding(node.lineno, "Mutable default argument", "medium", "robustness",
+                                             f"`{node.name}` uses a mutable default that is shared between calls.",
+                                             "Default to None and create the object inside the function."))
+                    break
+    return findings
+
+def _regex_findings(source_code: str, language: str) -> List[Dict[str, Any]]:
+    rules = [r for r in REGEX_RULES if language in r[0]]
+    if not rules:
+        return []
+    findings = []
+    for lineno, line in enumerate(source_code.splitlines(), 1):
+        if COMMENT_LINE.match(line):
+            continue
+        for _, pattern, title, severity, category, recommendation in rules:
+            if pattern.search(line):
+                findings.append(_finding(lineno, title, severity, category, f"`{line.strip()[:120]}`", recommendation))
+    return findings
+
+def _secret_findings(source_code: str) -> List[Dict[str, Any]]:
+    findings = []
+    for lineno, line in enumerate(source_code.splitlines(), 1):
+        if SECRET.search(line):
+            findings.append(_finding(lineno, "Hardcoded secret", "high", "security",
+                                     "A credential-like value is hardcoded in source.",
+                                     "Load secrets from the environment or a secret store."))
+    return findings
+
+def _call_name(func) -> str:
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        base = _call_name(func.value)
+        return f"{base}.{func.attr}" if base else func.attr
+    return ""
+
+def _kw_true(node: ast.Call, name: str) -> bool:
+    return any(k.arg == name and isinstance(k.value, ast.Constant) and k.value.value is True for k in node.keywords)
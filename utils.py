@@ -2,7 +2,8 @@ import os
 import logging
 import uuid
 import datetime
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Optional
 
 # Configure Logging
 logging.basicConfig(
@@ -15,6 +16,39 @@ logger = logging.getLogger("CodeReviewer")
 def get_logger(name: str):
     return logging.getLogger(name)
 
+def env_flag(name: str, default: bool) -> bool:
+    """Boolean setting from the environment: 1/true/yes (any case) enable it."""
+    return os.getenv(name, "true" if default else "false").lower() in ("1", "true", "yes")
+
+def as_int(value) -> int:
+    """int() for model-supplied values; anything unparseable (None, "n/a") becomes 0."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+class StatsCounter:
+    """Thread-safe named counters behind a module's *_STATS singleton and its stats endpoint."""
+
+    def __init__(self, *names: str):
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {name: 0 for name in names}
+
+    def inc(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.stats[name] = self.stats.get(name, 0) + amount
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+
 def generate_report_id() -> str:
     """Generate a unique 8-char ID for reports."""
     return str(uuid.uuid4())[:8]
@@ -48,3 +82,33 @@ def detect_language(filename: str) -> str:
     """Detect language from file extension."""
     _, ext = os.path.splitext(filename.lower())
     return EXT_LANG.get(ext, "text")
+
+def is_reviewable(filename: str) -> bool:
+    """True if the extension is in EXT_LANG."""
+    _, ext = os.path.splitext(filename.lower())
+    return ext in EXT_LANG
+
+RATING_KEYS = ("quality", "security", "maintainability", "overall")
+
+def aggregate_rating(files_map: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    """
+    Repo-level rating: per-metric mean of file ratings weighted by line count.
+    Fallback reviews (all-zero ratings) are excluded so an outage doesn't read as bad code.
+    """
+    totals = {k: 0.0 for k in RATING_KEYS}
+    weight_sum = 0
+    for entry in files_map.values():
+        rating = entry.get("structured", {}).get("rating", {})
+        try:
+            values = {k: float(rating.get(k, 0) or 0) for k in RATING_KEYS}
+        except (TypeError, ValueError):
+            continue
+        if not any(values.values()):
+            continue
+        weight = max(entry.get("source", "").count("\n") + 1, 1)
+        weight_sum += weight
+        for k in RATING_KEYS:
+            totals[k] += values[k] * weight
+    if not weight_sum:
+        return {k: None for k in RATING_KEYS}
+    return {k: round(totals[k] / weight_sum, 1) for k in RATING_KEYS}